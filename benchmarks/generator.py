@@ -0,0 +1,92 @@
+"""
+Seeded generator of synthetic sched.com and Pathable payloads for the benchmarks.
+"""
+import csv
+import os
+import random
+
+# Words bios, titles and abstracts are built from, including non ASCII text
+WORDS = ["arm", "linux", "kernel", "toolchain", "über", "développeur", "性能", "security", "LTS",
+         "boot", "firmware", "Android", "cloud", "edge", "AI", "Ø", "naïve", "straße", "データ",
+         "performance", "upstream", "open", "source", "virtualization", "RISC", "compiler"]
+TRACKS = ["Kernel", "Toolchain", "Security", "Cloud", "AI", "Android", "Keynote"]
+
+
+class SyntheticEvent:
+
+    """
+    A synthetic Connect event with a fixed number of sessions and users.
+
+    The same seed always produces the same payloads, so results from different runs can be
+    compared.
+    """
+
+    def __init__(self, sessions=100, users=300, seed=0, connect_code="bud20"):
+
+        self.connect_code = connect_code
+        rng = random.Random(seed)
+        self.users = [self._user(rng, index) for index in range(users)]
+        self.details = {user["username"]: self._details(rng, user) for user in self.users}
+        self.sessions = [self._session(rng, index) for index in range(sessions)]
+
+    def _text(self, rng, low, high):
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+    def _user(self, rng, index):
+        return {
+            "username": "user{0}".format(index),
+            "name": "Speaker {0} {1}".format(index, rng.choice(WORDS).title()),
+            "company": rng.choice(["Linaro", "Arm", "Qualcomm", "Google", "Red Hat"]),
+            "position": rng.choice(["Engineer", "Director", "Architect", "Maintainer"]),
+            "location": rng.choice(["Cambridge, UK", "Austin, US", "Bangkok, TH", "Paris, FR"]),
+            # Most speakers have an avatar and some share a default one
+            "avatar": "/avatars/{0}.png".format(index % max(1, len(WORDS) * 8))
+                      if rng.random() < 0.9 else "",
+        }
+
+    def _details(self, rng, user):
+        return {"username": user["username"], "about": self._text(rng, 20, 400),
+                "url": "https://example.com/{0}".format(user["username"])}
+
+    def _session(self, rng, index):
+        code = self.connect_code.upper()
+        speakers = rng.sample(self.users, min(len(self.users), rng.randint(1, 4)))
+        day = 23 + index % 5
+        hour = 9 + index % 8
+        return {
+            "id": "session{0}".format(index),
+            "name": "{0}-{1} {2}".format(code, 100 + index, self._text(rng, 3, 9)),
+            "event_start": "2020-03-{0:02d} {1:02d}:00".format(day, hour),
+            "event_end": "2020-03-{0:02d} {1:02d}:25".format(day, hour),
+            "invite_only": "N",
+            "event_type": rng.choice(TRACKS),
+            "event_subtype": rng.choice(["", "Beginner", "Advanced"]),
+            "description": self._text(rng, 50, 300),
+            "venue": "Room {0}".format(rng.randint(1, 20)),
+            "speakers": ", ".join(speaker["name"] for speaker in speakers),
+        }
+
+    def write_pathable_csvs(self, directory):
+        """Writes sessions.csv and users.csv shaped like the Pathable exports main.py reads"""
+        emails = {user["name"]: user["username"] + "@example.com" for user in self.users}
+        with open(os.path.join(directory, "sessions.csv"), "w", newline="", encoding="utf8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["ID", "Session ID", "Date", "Time", "Title", "Description", "Room",
+                             "Tracks", "Type", "Level", "Speakers"])
+            for session in self.sessions:
+                code, title = session["name"].split(" ", 1)
+                speakers = [emails[name.strip()] for name in session["speakers"].split(",")]
+                writer.writerow([session["id"], code, session["event_start"][:10],
+                                 session["event_start"][11:], title, session["description"],
+                                 session["venue"], session["event_type"], "Talk", "",
+                                 ",".join(speakers)])
+        with open(os.path.join(directory, "users.csv"), "w", newline="", encoding="utf8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["ID", "Prefix", "First Name", "Last Name", "Title", "Department",
+                             "Company", "Bio", "Phone", "City", "Country", "Twitter", "Email",
+                             "Website", "Registered", "Type", "Photo URL"])
+            for index, user in enumerate(self.users):
+                first_name, last_name = user["name"].split(" ", 1)
+                writer.writerow([index, "", first_name, last_name, user["position"], "",
+                                 user["company"], self.details[user["username"]]["about"], "",
+                                 "", "", "", emails[user["name"]], "", "", "Speaker", ""])
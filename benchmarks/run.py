@@ -0,0 +1,168 @@
+"""
+Benchmarks the post pipeline on synthetic events at several scales.
+
+Each scenario and scale runs in a fresh process so peak RSS is per scenario. Every scenario
+runs twice in the same directory: cold (nothing on disk) and warm (a rerun with no changes).
+
+Run with: python -m benchmarks.run --scales 100,1000 --output results.json
+Compare with: python -m benchmarks.run --compare old.json --output new.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SCENARIOS = ["write_posts", "sched", "pathable"]
+
+
+def io_counters():
+    """Returns the read/write syscall counts of this process, or None off Linux"""
+    try:
+        with open("/proc/self/io") as io_file:
+            counters = dict(line.split(": ") for line in io_file.read().splitlines())
+    except OSError:
+        return None
+    return {"read_syscalls": int(counters["syscr"]), "write_syscalls": int(counters["syscw"])}
+
+
+def measure(phase, posts, run):
+    """Runs a phase and returns its timings, syscall counts and the peak RSS so far"""
+    before = io_counters()
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        extra = run()
+    seconds = time.perf_counter() - start
+    after = io_counters()
+    result = {
+        "phase": phase,
+        "posts": posts,
+        "seconds": seconds,
+        "posts_per_second": posts / seconds if seconds else 0.0,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    if before and after:
+        result.update({name: after[name] - before[name] for name in before})
+    # Scenarios can report extra numbers such as the write_posts counts
+    if isinstance(extra, dict):
+        result.update(extra)
+    return result
+
+
+def bench_write_posts(event, directory):
+    from jekyll_post_tool import JekyllPostTool
+
+    posts = [({"title": session["name"], "session_id": session["id"],
+               "description": session["description"], "tags": session["event_type"]},
+              "", session["id"] + ".md") for session in event.sessions]
+    post_tool = JekyllPostTool({"output": os.path.join(directory, "posts"),
+                                "hash_file": os.path.join(directory, "hashes.json")})
+    return [measure(phase, len(posts), lambda: post_tool.write_posts(posts)["counts"])
+            for phase in ("cold", "warm")]
+
+
+def bench_sched(event, directory):
+    from benchmarks.stub_server import SchedStubServer
+    from examples.sched import ConnectSchedJekyllPosts
+
+    stub = SchedStubServer(event).start()
+    os.chdir(directory)
+    results = []
+    try:
+        for phase in ("cold", "warm"):
+            stub.requests.clear()
+            # The stub does not throttle, so the client's rate limit is set out of the way
+            result = measure(phase, len(event.sessions), lambda: ConnectSchedJekyllPosts(
+                stub.url, "benchmark-key", event.connect_code, cache_ttl=0,
+                requests_per_second=1000))
+            result["http_requests"] = sum(stub.requests.values())
+            results.append(result)
+    finally:
+        stub.stop()
+    return results
+
+
+def bench_pathable(event, directory):
+    sys.path.insert(0, ROOT)
+    from main import JekyllConnectSessionsTool
+
+    os.chdir(directory)
+    event.write_pathable_csvs(directory)
+    with open("template.md", "w") as template:
+        template.write("---\nlayout: resource-post\n---\n")
+    # Cold creates the posts, warm updates them in place from the same exports
+    return [
+        measure("cold", len(event.sessions), lambda: JekyllConnectSessionsTool()),
+        measure("warm", len(event.sessions), lambda: JekyllConnectSessionsTool("posts/")),
+    ]
+
+
+def run_child(scenario, scale, seed):
+    """Runs one scenario at one scale in this process and prints the results as JSON"""
+    from benchmarks.generator import SyntheticEvent
+
+    event = SyntheticEvent(sessions=scale, users=scale * 2, seed=seed)
+    with tempfile.TemporaryDirectory() as directory:
+        results = globals()["bench_" + scenario](event, directory)
+        os.chdir(ROOT)
+    for result in results:
+        result.update({"scenario": scenario, "scale": scale})
+    print(json.dumps(results))
+
+
+def compare(baseline, results):
+    """Prints the change in posts/sec of each result against a baseline run"""
+    previous = {(r["scenario"], r["scale"], r["phase"]): r for r in baseline["results"]}
+    for result in results:
+        old = previous.get((result["scenario"], result["scale"], result["phase"]))
+        if old and old["posts_per_second"]:
+            change = result["posts_per_second"] / old["posts_per_second"] - 1
+            print("{scenario:12} {scale:>7} {phase:5} {change:+7.1%}".format(change=change, **result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--scales", default="100,1000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="A previous results file to compare against")
+    parser.add_argument("--child", nargs=2, metavar=("SCENARIO", "SCALE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args.child[0], int(args.child[1]), args.seed)
+
+    results = []
+    for scenario in args.scenarios.split(","):
+        for scale in [int(scale) for scale in args.scales.split(",")]:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.run", "--seed", str(args.seed),
+                 "--child", scenario, str(scale)],
+                cwd=ROOT, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+            for result in json.loads(output.splitlines()[-1]):
+                results.append(result)
+                print("{scenario:12} {scale:>7} {phase:5} {posts_per_second:10.1f} posts/sec "
+                      "{peak_rss_kb:>9} KB peak".format(**result))
+
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count(), "seed": args.seed},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(json.load(baseline_file), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmarks front matter serialization on a synthetic 2,000 session event.
+
+Run with: python -m benchmarks.serializer
+"""
+import time
+
+import frontmatter
+import yaml
+
+from benchmarks.generator import SyntheticEvent
+from examples.sched import build_session_post
+from jekyll_post_tool import YAMLSerializer
+
+SESSIONS = 2000
+
+
+def synthetic_posts(sessions=SESSIONS, seed=2020):
+    """Returns (front_matter, content) pairs built the way examples/sched.py builds its posts"""
+    event = SyntheticEvent(sessions=sessions, users=sessions * 2, seed=seed)
+    users = {user["name"]: user for user in event.users}
+    posts = []
+    for session in event.sessions:
+        speakers = []
+        for name in session["speakers"].split(","):
+            user = users[name.strip()]
+            image = "/assets/images/speakers/{0}/{1}.jpg".format(
+                event.connect_code, user["username"])
+            speakers.append((user, event.details[user["username"]], image))
+        front_matter, content, file_name = build_session_post(
+            (event.connect_code, session, speakers, None))
+        posts.append((front_matter, content))
+    return posts
+
+
+def frontmatter_dumps(front_matter, content):
+    """Serializes a post the way JekyllPostTool used to, through an unmodified frontmatter.dumps"""
+    post = frontmatter.Post(content)
+    post.metadata = front_matter
+    return frontmatter.dumps(post)
+
+
+def run(serialize, posts):
+    """Returns the posts/sec achieved serializing every post and the rendered output"""
+    start = time.perf_counter()
+    output = [serialize(front_matter, content) for front_matter, content in posts]
+    return len(posts) / (time.perf_counter() - start), output
+
+
+def main():
+    posts = synthetic_posts()
+    baseline, expected = run(frontmatter_dumps, posts)
+    # frontmatter picks the libyaml dumper itself when PyYAML has it
+    print("frontmatter.dumps ({0}): {1:8.1f} posts/sec".format(
+        frontmatter.default_handlers.SafeDumper.__name__, baseline))
+    if yaml.__with_libyaml__:
+        serializer = YAMLSerializer()
+    else:
+        print("libyaml is not available, YAMLSerializer falls back to SafeDumper")
+        serializer = YAMLSerializer(yaml.SafeDumper)
+    fast, output = run(serializer.serialize, posts)
+    print("YAMLSerializer ({0}): {1:8.1f} posts/sec ({2:.1f}x)".format(
+        serializer.dumper.__name__, fast, fast / baseline))
+    print("Byte identical output: {0}".format(output == expected))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Local stub of the sched.com API serving a SyntheticEvent.
+"""
+import json
+import time
+import threading
+import hashlib
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+class SchedStubServer:
+
+    """
+    Serves the session list, user list, user details and avatars of a SyntheticEvent on
+    localhost, honouring the since parameter and ETag revalidation, and counts requests.
+    With rate_limit set, API requests beyond that many per second are answered with 429
+    and a Retry-After header, like the real API when it throttles.
+    """
+
+    def __init__(self, event, rate_limit=None, retry_after=1):
+
+        self.event = event
+        # Request path -> number of requests
+        self.requests = Counter()
+        # Session id -> unix time the session was last modified, an hour ago to start with
+        modified = int(time.time()) - 3600
+        self.modified = {session["id"]: modified for session in event.sessions}
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        # Start times of the API requests allowed in the last second
+        self._window = []
+        self._window_lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{0}".format(self._server.server_port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _throttle(self):
+        """Returns True if an API request should be throttled"""
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        with self._window_lock:
+            self._window = [started for started in self._window if now - started < 1]
+            if len(self._window) >= self.rate_limit:
+                self.requests["throttled"] += 1
+                return True
+            self._window.append(now)
+        return False
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            # Keep connections alive like the real API without Nagle delays on small responses
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                stub.requests[url.path] += 1
+                if url.path.startswith("/api/") and stub._throttle():
+                    self.send_response(429)
+                    self.send_header("Retry-After", str(stub.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if url.path == "/api/session/list":
+                    since = int(query.get("since", ["0"])[0])
+                    body = [session for session in stub.event.sessions
+                            if stub.modified[session["id"]] >= since]
+                elif url.path == "/api/user/list":
+                    # Avatars are served by the stub too
+                    body = [dict(user, avatar=stub.url + user["avatar"]) if user["avatar"] else user
+                            for user in stub.event.users]
+                elif url.path == "/api/user/get":
+                    body = stub.event.details.get(query.get("term", [""])[0], {})
+                elif url.path.startswith("/avatars/"):
+                    return self._send(url.path.encode("utf-8") * 64, "image/png")
+                else:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self._send(json.dumps(body).encode("utf-8"), "application/json")
+
+            def _send(self, data, content_type):
+                etag = '"{0}"'.format(hashlib.sha1(data).hexdigest())
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
@@ -0,0 +1,91 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+import time
+from concurrent import futures
+
+from jekyll_post_tool import ImageDownloader, RateLimitedSession, Metrics, PrintSink
+from examples.sched import ConnectSchedJekyllPosts, SpeakerDetails, SCHED_API_KEY
+
+class MultiEventSchedSync:
+
+    """
+    This class syncs several Connect events from sched.com concurrently in one process.
+
+    Every event gets its own ConnectSchedJekyllPosts with its own output directory, but they
+    share one rate limited HTTP client (so one connection pool and one rate budget), one
+    speaker details cache keyed by sched url and username that sends a single request per
+    speaker even when events look them up at once, and one content addressed avatar store, so
+    avatars used at several events are downloaded once. A full rebuild of every event takes
+    about as long as the slowest event rather than the sum of them all.
+    """
+
+    def __init__(self, configs, api_key, images_output_path="speaker-images/",
+                 requests_per_second=10, max_concurrent_requests=8, max_events=None,
+                 metrics_sink=None, **event_options):
+
+        # (sched_url, connect_code) of every event to sync
+        self.configs = list(configs)
+        self.api_key = api_key
+        # Number of events synced at once, all of them by default
+        self.max_events = max_events or len(self.configs) or 1
+        self.metrics = Metrics(metrics_sink or PrintSink())
+        # Shared by every event
+        self.client = RateLimitedSession(
+            rate=requests_per_second, pool_size=max_concurrent_requests * self.max_events,
+            metrics=self.metrics)
+        self.image_downloader = ImageDownloader(
+            images_output_path, session=self.client.session,
+            max_workers=max_concurrent_requests, metrics=self.metrics)
+        self.speaker_details = SpeakerDetails()
+        self.speaker_images = {}
+        self.events = {}
+        for sched_url, connect_code in self.configs:
+            self.events[connect_code] = ConnectSchedJekyllPosts(
+                sched_url, api_key, connect_code, run=False, metrics_sink=metrics_sink,
+                client=self.client, image_downloader=self.image_downloader,
+                speaker_details=self.speaker_details, speaker_images=self.speaker_images,
+                **event_options)
+
+    def main(self):
+        """
+        Syncs every event concurrently
+        Returns a dict of connect code -> number of sessions changed, or False if the sync failed
+        """
+        results = {}
+        started = time.perf_counter()
+        with futures.ThreadPoolExecutor(max_workers=self.max_events) as executor:
+            running = {executor.submit(self.sync_event, event): connect_code
+                       for connect_code, event in self.events.items()}
+            for future in futures.as_completed(running):
+                connect_code = running[future]
+                try:
+                    results[connect_code] = future.result()
+                except Exception as e:
+                    self.metrics.event("{0} sync failed: {1!r}".format(connect_code, e),
+                                       connect_code=connect_code)
+                    results[connect_code] = False
+        self.metrics.incr("events_failed", sum(result is False for result in results.values()))
+        self.metrics.event("Synced {0} events in {1:.2f}s".format(
+            len(results), time.perf_counter() - started), results=results)
+        self.metrics.flush()
+        return results
+
+    def sync_event(self, event):
+        """
+        Syncs one event, recording how long it took
+        """
+        started = time.perf_counter()
+        try:
+            return event.main()
+        finally:
+            self.metrics.record("event", time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    MultiEventSchedSync([
+        ("https://bud20.sched.com", "bud20"),
+        ("https://san19.sched.com", "san19"),
+        ("https://bkk19.sched.com", "bkk19"),
+    ], SCHED_API_KEY).main()
@@ -1,17 +1,166 @@
-from slugify import slugify
-from urllib import request
 import sys
 import os
 import re
-from urllib.parse import urlparse
 sys.path.insert(0, os.path.abspath(
     os.path.join(os.path.dirname(__file__), '..')))
-import requests
 import datetime
+import hashlib
 import json
+import time
+import threading
+from concurrent import futures
+
+from jekyll_post_tool import (JekyllPostTool, ImageDownloader, ResponseCache, PostManifest,
+                              atomic_write, plan_posts, apply_plan, DataFile, RateLimitedSession, PRIORITY_BULK,
+                              PRIORITY_LOOKUP, Metrics, PrintSink, NullSink, iter_json_array)
+try:
+    from secrets import SCHED_API_KEY
+except ImportError:
+    # No local secrets.py, fall back to the environment
+    SCHED_API_KEY = os.environ.get("SCHED_API_KEY")
+
+# The since timestamp used to fetch every session
+FULL_SYNC_SINCE = 1282755813
+
+def session_post_name(session, connect_code):
+    """
+    Returns (session_id, session_name, file_name) for a session, or None if its title has
+    no session id
+    """
+    # Get the session id from the title
+    session_id_regex = re.compile('{0}-[A-Za-z]*[0-9]+K*[0-9]*'.format(connect_code.upper()))
+    session_id = session_id_regex.findall(session["name"])
+    if len(session_id) == 0:
+        return None
+    session_id = session_id[0]
+    session_name = session_id_regex.sub("", session["name"]).strip()
+    # Date the post by the session so its name is stable between runs
+    post_date = session["event_start"][:10] or datetime.datetime.now().strftime("%Y-%m-%d")
+    return session_id, session_name, post_date + "-" + session_id.lower() + ".md"
+
+def session_front_matter(session, connect_code):
+    """
+    Builds the front matter of a session post without its speakers
+    """
+    session_id, session_name, post_file_name = session_post_name(session, connect_code)
+    session_track = session.get("event_type")
+    session_sub_track = session.get("event_subtype")
+    session_tracks = None
+    if session_track:
+        if session_sub_track:
+            if "," in session_sub_track:
+                session_tracks = session_sub_track.split(",")
+                session_tracks.append(session_track)
+            else:
+                session_tracks = session_track + ", " + session_sub_track
+        else:
+            session_tracks = session_track
+    return {
+        "title": session_id + " - " + session_name,
+        "session_id": session_id,
+        "description": "{}".format(session.get("description", "Coming soon")).replace("'", ""),
+        "image": {
+            "path": "/assets/images/featured-images/san19/" + session_id + ".png",
+            "featured": "true",
+        },
+        "session_room": session.get("venue"),
+        "session_slot": {
+            "start_time": session["event_start"],
+            "end_time": session["event_end"],
+        },
+        "tags": session_tracks,
+        "categories": [connect_code],
+        "session_track": session_track,
+        "tag": "session",
+    }
+
+def build_session_post(record):
+    """
+    Builds a session post from a (connect_code, session, speakers, file_name) record, where
+    speakers holds a (user, details, image) tuple per speaker. This is the write_posts
+    builder, so with render processes the posts are built in the workers and only the raw
+    sched.com records are sent to them.
+    """
+    connect_code, session, speakers, post_file_name = record
+    post_frontmatter = session_front_matter(session, connect_code)
+    post_frontmatter["session_speakers"] = [
+        {
+            "speaker_name": user["name"],
+            "speaker_username": user["username"],
+            "speaker_url": details.get("url", ""),
+            "speaker_company": user["company"],
+            "speaker_position": user["position"],
+            "speaker_location": user["location"],
+            "speaker_image": image,
+            "speaker_bio": "{}".format(details.get("about", "")).replace("'", ""),
+        }
+        for user, details, image in speakers
+    ]
+    return post_frontmatter, "", post_file_name
+
+class SpeakerDetails:
+
+    """
+    This class caches speaker details from /api/user/get keyed by (sched_url, username).
+
+    It can be shared by the events synced in one process. Lookups of a speaker that is already
+    being fetched wait for that request instead of sending another. Failed lookups are
+    remembered until forget_failed is called at the start of the next sync, so a speaker
+    whose details can't be fetched is only requested once per sync.
+    """
+
+    def __init__(self):
+
+        # (sched_url, username) -> Future of the details
+        self._futures = {}
+        self._lock = threading.Lock()
 
-from jekyll_post_tool import JekyllPostTool
-from secrets import SCHED_API_KEY
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._futures
+
+    def get(self, key, fetch):
+        """
+        Returns the details for key, calling fetch() to get them unless they are cached or
+        already being fetched
+        """
+        with self._lock:
+            future = self._futures.get(key)
+            fetching = future is None
+            if fetching:
+                future = self._futures[key] = futures.Future()
+        if fetching:
+            try:
+                details = fetch()
+            except BaseException as e:
+                self.forget(key)
+                future.set_exception(e)
+                raise
+            future.set_result(details)
+        return future.result()
+
+    def forget(self, key):
+        """
+        Drops the cached details for key so they are fetched again
+        """
+        with self._lock:
+            self._futures.pop(key, None)
+
+    def forget_failed(self, sched_url):
+        """
+        Drops the failed lookups for an event so they are fetched again
+        """
+        with self._lock:
+            for key, future in list(self._futures.items()):
+                if key[0] == sched_url and future.done() and future.result() is False:
+                    del self._futures[key]
+
+    def clear(self):
+        """
+        Drops every cached speaker
+        """
+        with self._lock:
+            self._futures.clear()
 
 class ConnectSchedJekyllPosts:
 
@@ -19,9 +168,14 @@ class ConnectSchedJekyllPosts:
     This class handles the creation of Jekyll posts based on the sched.com API.
     """
 
-    def __init__(self, sched_url, SCHED_API_KEY, connect_code):
+    def __init__(self, sched_url, SCHED_API_KEY, connect_code, cache_ttl=300, offline=False,
+                 full_resync=False, dry_run=False, render_processes=None, metrics_sink=None,
+                 requests_per_second=10, run=True, client=None, image_downloader=None,
+                 speaker_details=None, speaker_images=None):
         # Script verbosity
         self._verbose = True
+        # Per stage timings and counters for the run, printed unless another sink is given
+        self.metrics = Metrics(metrics_sink or (PrintSink() if self._verbose else NullSink()))
         # Import API Secret
         self.API_KEY = SCHED_API_KEY
         # Connect Code
@@ -34,44 +188,320 @@ class ConnectSchedJekyllPosts:
         self.output_path = self.connect_code + "/"
         self.posts_output_path = self.output_path + "posts/"
         self.images_output_path = self.output_path + "images/"
+        # Sync state with the since watermark and the sessions seen so far
+        self.state_file = self.output_path + "sync-state.json"
+        # Sync state kept in memory between cycles once loaded
+        self.state = None
+        # Health of the sync for monitoring, written by watch
+        self.status_file = self.output_path + "sync-status.json"
+        # Why the last sync failed, None if it succeeded
+        self.last_error = None
+        # Ignore the watermark and fetch every session
+        self.full_resync = full_resync
         # Blacklisted tracks to ignore when creating pages/resources.json
         self.blacklistedTracks = ["Food & Beverage", "Informational"]
+        # Index of the sessions in the Jekyll _data directory
+        self.resources_data_file = DataFile(self.output_path + "_data/resources.json")
+
+        # Maximum number of concurrent requests made to the sched.com API
+        self.max_concurrent_requests = 8
+        # Rate limited client over pooled keep-alive connections shared by every API request,
+        # retrying throttled and failed requests and sending the list requests first.
+        # The client, image downloader and speaker caches can be shared between events
+        self.client = client or RateLimitedSession(
+            rate=requests_per_second, pool_size=self.max_concurrent_requests, metrics=self.metrics)
+        self.session = self.client.session
+        # Disk cache of API responses, offline serves only from the cache
+        self.response_cache = ResponseCache(
+            self.output_path + ".cache/", ttl=cache_ttl, offline=offline, metrics=self.metrics)
+        # Speaker details from /api/user/get for the whole run, which can be shared between events
+        self.speaker_details = SpeakerDetails() if speaker_details is None else speaker_details
+        # Usernames whose details are revalidated with sched.com the next time they are fetched
+        self.stale_speakers = set()
+        # Downloads speaker avatars into a deduplicated store using conditional requests
+        self.image_downloader = image_downloader or ImageDownloader(
+            self.images_output_path, session=self.session,
+            max_workers=self.max_concurrent_requests, metrics=self.metrics)
+        # Speaker avatar url -> downloaded image file name
+        self.speaker_images = {} if speaker_images is None else speaker_images
+
+        # Report the reconcile plan instead of applying it
+        self.dry_run = dry_run
 
         # Setup a new instance of the JekyllPostTool
         self.post_tool = JekyllPostTool(
-            {"output": self.output_path + "posts/" }, verbose=True)
+            {"output": self.output_path + "posts/",
+             "hash_file": self.output_path + "post-hashes.json",
+             "render_processes": render_processes,
+             "metrics": self.metrics}, verbose=True)
+        # Index of the existing posts by session id
+        self.manifest = PostManifest(self.posts_output_path)
 
-        # Main Method
-        self.main()
+        # Main Method, skipped when the caller drives the syncs e.g with watch
+        if run:
+            self.main()
 
     def main(self):
         """
         Main method for the JekyllSchedExportTool
+        Returns the number of sessions that changed, or False if the sync failed
+        """
+        # The state is only read from disk once, later syncs reuse it from memory
+        if self.state is None:
+            self.state = self.load_sync_state()
+        state = self.state
+        # The since list is never cached, so offline every session in the sync state is
+        # regenerated from it instead
+        offline = self.response_cache.offline
+        # Without a watermark every session is fetched, so posts for any others can be pruned
+        full_sync = state["since"] == FULL_SYNC_SINCE and not offline
+        # Start the next watermark a little before this sync to allow for clock skew
+        sync_started = int(time.time()) - 60
+        self.last_error = None
+        # Speakers that could not be fetched last sync are tried again
+        self.speaker_details.forget_failed(self.sched_url)
+        try:
+            # Stream the sessions modified since the last successful sync from sched api,
+            # merging each into the sessions from earlier syncs as it is parsed. The list
+            # bypasses the response cache: its URL changes with every watermark and a cached
+            # copy older than sync_started would lose edits
+            changed_sessions = []
+            if offline:
+                changed_sessions = list(state["sessions"].values())
+            else:
+                for session in self.stream_api_results(
+                        "/api/session/list?api_key={0}&since=" + str(state["since"]) +
+                        "&format=json", cache=False):
+                    state["sessions"][self.session_key(session)] = session
+                    changed_sessions.append(session)
+            # Index the users by name as they are parsed rather than holding the whole list
+            self.users_by_name = {}
+            for user in self.stream_api_results("/api/user/list?api_key={0}&format=json"):
+                self.users_by_name.setdefault(user["name"], []).append(user)
+        except Exception as e:
+            self.metrics.incr("api_errors")
+            self.metrics.event(str(e))
+            self.metrics.flush()
+            self.last_error = repr(e)
+            return False
+        self.sessions_data = list(state["sessions"].values())
+        # The user list has no since parameter, so changed speakers are found by comparing it
+        # with the last sync and the sessions they speak in are regenerated too
+        changed_sessions.extend(self.sessions_of_changed_users(state, changed_sessions))
+        # Create Update Delete the Jekyll event posts affected by the changes
+        posts = self.crud_jekyll_posts(changed_sessions, self.users_by_name, prune=full_sync)
+        # Update the entries of the changed sessions in the resources data file
+        self.generate_resources_json_file(posts, prune=full_sync)
+        # Only move the watermark on once the posts have been written, and never from
+        # responses served by an offline cache
+        if not self.dry_run and not offline:
+            state["since"] = sync_started
+            self.save_sync_state(state)
+        self.metrics.flush()
+        return len(changed_sessions)
+
+    def watch(self, min_interval=60, max_interval=3600, speaker_refresh=3600, cycles=None):
+        """
+            Keeps syncing on an adaptive interval, reusing the HTTP connections, speaker
+            details, sync state and manifest from one cycle to the next so each cycle only
+            applies the sessions that changed.
+            Polls every min_interval seconds while the event is on or sessions are changing,
+            backing off towards max_interval otherwise. Speaker details and avatars are
+            refetched every speaker_refresh seconds and the posts of every session with
+            speakers are rebuilt with them. The health of the sync is written to status_file
+            after every cycle. Runs until interrupted, or for the given number of cycles.
+        """
+        interval = min_interval
+        cycle = 0
+        # Carry the last success over from an earlier run so the lag survives restarts
+        last_success = self.read_status().get("last_success")
+        speakers_fetched = time.time()
+        while cycles is None or cycle < cycles:
+            cycle += 1
+            if time.time() - speakers_fetched >= speaker_refresh:
+                # Forgetting the user hashes makes the next sync treat every speaker as
+                # changed, refetching their details and rebuilding their sessions
+                if self.state is not None:
+                    self.state.pop("users", None)
+                self.speaker_images.clear()
+                speakers_fetched = time.time()
+            self.metrics.reset()
+            started = time.time()
+            error = None
+            try:
+                changed = self.main()
+                error = self.last_error
+            except KeyboardInterrupt:
+                break
+            except Exception as e:
+                changed = False
+                error = repr(e)
+                self.metrics.event("Sync failed: {}".format(error))
+            if changed is not False:
+                last_success = started
+            interval = self.next_interval(interval, changed, min_interval, max_interval)
+            self.write_status({
+                "connect_code": self.connect_code,
+                "cycle": cycle,
+                "status": "ok" if changed is not False else "error",
+                "error": error,
+                "last_attempt": started,
+                "last_success": last_success,
+                # Sessions changed after last_success may not have been published yet
+                "lag_seconds": None if last_success is None else time.time() - last_success,
+                "since": self.state["since"] if self.state else None,
+                "changed_sessions": changed if changed is not False else None,
+                "interval": interval,
+                "next_poll": time.time() + interval,
+            })
+            if cycles is not None and cycle >= cycles:
+                break
+            try:
+                time.sleep(interval)
+            except KeyboardInterrupt:
+                break
+        return cycle
+
+    def next_interval(self, interval, changed, min_interval, max_interval):
+        """
+            Returns how long to wait before the next sync. Polls at min_interval while the
+            event is running or the last sync found changes, otherwise backs off by half
+            each cycle up to max_interval, or a quarter of it before the event has started.
+        """
+        if changed or self.event_phase() == "during":
+            return min_interval
+        limit = max_interval // 4 if self.event_phase() == "before" else max_interval
+        return max(min_interval, min(limit, interval * 1.5))
+
+    def event_phase(self):
+        """
+            Returns "before", "during" or "after" depending on where now falls relative to
+            the sessions known so far, with a day's margin either side of the event
+        """
+        slots = [(session["event_start"][:16], session["event_end"][:16])
+                 for session in (self.state or {}).get("sessions", {}).values()
+                 if session.get("event_start") and session.get("event_end")]
+        if not slots:
+            return "before"
+        margin = datetime.timedelta(days=1)
+        try:
+            first = datetime.datetime.strptime(min(start for start, end in slots), "%Y-%m-%d %H:%M")
+            last = datetime.datetime.strptime(max(end for start, end in slots), "%Y-%m-%d %H:%M")
+        except ValueError:
+            return "during"
+        now = datetime.datetime.now()
+        if now < first - margin:
+            return "before"
+        if now > last + margin:
+            return "after"
+        return "during"
+
+    def read_status(self):
         """
-        # Get the results from sched api
-        self.sessions_data = self.get_api_results(
-            "/api/session/list?api_key={0}&since=1282755813&format=json")
-        # self.generate_resources_json_file(self.sessions_data)
-        self.users_data = self.get_api_results(
-            "/api/user/list?api_key={0}&format=json")
-        # Create Update Delete the Jekyll event posts
-        self.crud_jekyll_posts(self.sessions_data, self.users_data)
+        Returns the status written by the last watch cycle, or {} if there is none
+        """
+        try:
+            with open(self.status_file, "r") as status_file:
+                return json.load(status_file)
+        except (OSError, ValueError):
+            return {}
+
+    def write_status(self, status):
+        """
+        Atomically writes the status of the sync for monitoring
+        """
+        atomic_write(self.status_file,
+                     json.dumps(status, indent=2, sort_keys=True).encode("utf-8"))
 
-        # self.generate_resources_json_file(self.sessions_data)
+    def sessions_of_changed_users(self, state, changed_sessions):
+        """
+        Returns the sessions not in changed_sessions with a speaker whose user records were
+        added, changed or removed since the last sync, recording the users in the state
+        """
+        previous_users = state.get("users", {})
+        users = {}
+        for name, user_objects in self.users_by_name.items():
+            users[name] = hashlib.sha256(json.dumps(
+                user_objects, sort_keys=True).encode("utf-8")).hexdigest()
+        changed_names = set(name for name in users.keys() | previous_users.keys()
+                            if users.get(name) != previous_users.get(name))
+        state["users"] = users
+        # Cached details of changed speakers are fetched again so new bios are picked up
+        for name in changed_names:
+            for user in self.users_by_name.get(name, []):
+                self.speaker_details.forget((self.sched_url, user["username"]))
+                self.stale_speakers.add(user["username"])
+        known = set(self.session_key(session) for session in changed_sessions)
+        sessions = []
+        for key, session in state["sessions"].items():
+            speakers = set(speaker.strip() for speaker in session.get("speakers", "").split(","))
+            if key not in known and speakers & changed_names:
+                sessions.append(session)
+        self.metrics.incr("speakers_changed", len(changed_names))
+        return sessions
+
+    def session_key(self, session):
+        """
+        Returns the key sessions are merged on, the sched id where there is one
+        """
+        return session.get("id") or session["name"]
+
+    def load_sync_state(self):
+        """
+        Loads the sync state for this connect code, starting from scratch on a full resync
+        unless offline, when the saved sessions are all there is to regenerate from
+        """
+        state = {"connect_code": self.connect_code, "since": FULL_SYNC_SINCE, "sessions": {}}
+        fresh_start = self.full_resync and not self.response_cache.offline
+        if fresh_start or not os.path.exists(self.state_file):
+            return state
+        with open(self.state_file, "r") as state_file:
+            saved_state = json.load(state_file)
+        if saved_state.get("connect_code") == self.connect_code:
+            state.update(saved_state)
+        return state
+
+    def save_sync_state(self, state):
+        """
+        Atomically writes the sync state
+        """
+        atomic_write(self.state_file, json.dumps(state).encode("utf-8"))
 
-    def get_api_results(self, endpoint):
+    def get_api_results(self, endpoint, priority=PRIORITY_LOOKUP, refresh=False):
         """
-            Gets the results from a specified endpoint
+            Gets the results from a specified endpoint through the response cache
         """
         endpoint = self.sched_url + endpoint.format(self.API_KEY)
         try:
-            resp = requests.get(url=endpoint)
-            data = resp.json()
-            return data
+            return self.response_cache.fetch(self.client, endpoint, refresh=refresh, timeout=60,
+                                             priority=priority)
         except Exception as e:
-            print(e)
+            self.metrics.incr("api_errors")
+            self.metrics.event(str(e), endpoint=self.response_cache.key(endpoint))
             return False
 
+    def stream_api_results(self, endpoint, priority=PRIORITY_BULK, cache=True):
+        """
+            Yields the records of a list endpoint one at a time as the response is read,
+            through the response cache unless cache is False
+        """
+        endpoint = self.sched_url + endpoint.format(self.API_KEY)
+        if cache:
+            return self.response_cache.fetch_records(self.client, endpoint, timeout=60,
+                                                     priority=priority)
+        return self.stream_uncached(endpoint, priority)
+
+    def stream_uncached(self, endpoint, priority=PRIORITY_BULK):
+        """
+            Yields the records of a list endpoint straight from sched.com
+        """
+        with self.metrics.timer("fetch"):
+            resp = self.client.get(endpoint, stream=True, timeout=60, priority=priority)
+        self.metrics.incr("api_calls")
+        with resp:
+            resp.raise_for_status()
+            yield from iter_json_array(resp.iter_content(65536))
+
     # def get_session_data(self, sessions_data, users_data):
     #     """Get the complete data for each session
 
@@ -90,202 +520,159 @@ class ConnectSchedJekyllPosts:
 
 
 
-    def crud_jekyll_posts(self, sessions_data, users_data):
+    def crud_jekyll_posts(self, sessions_data, users_by_name, prune=False):
         """
-            This method creates/updates/deletes jekyll posts based on api results
+            This method creates/updates/deletes jekyll posts based on api results.
+            The posts are reconciled against the output directory by session id and
+            when prune is True posts for sessions not in sessions_data are deleted.
+            users_by_name maps each user name to the sched users with that name.
+            Returns the (connect_code, session, speakers, file_name) record of each post
+            keyed by session id, see build_session_post.
         """
+        # The posts that should exist keyed by session id
+        posts = {}
+        # Fetch every speaker's details up front
+        speaker_usernames = set()
+        speaker_avatars = set()
+        for session in sessions_data:
+            for speaker in session.get("speakers", "").split(","):
+                for speaker_object in users_by_name.get(speaker.strip(), []):
+                    speaker_usernames.add(speaker_object["username"])
+                    if len(speaker_object["avatar"]) >= 3:
+                        speaker_avatars.add(speaker_object["avatar"])
+        self.prefetch_speaker_details(speaker_usernames)
+        # Avatars already downloaded this run are not requested again
+        self.speaker_images.update(self.image_downloader.download_many(
+            speaker_avatars - set(self.speaker_images)))
+
+        join_started = time.perf_counter()
         for session in sessions_data:
-            # Grab the relevant data from the sessions results
             session_title = session["name"]
-            session_start_time = session["event_start"]
-            session_end_time = session["event_end"]
-            session_private = session["invite_only"]
-            session_track = None
-            session_room = None
-            session_sub_track = None
-            session_speakers = None
-            session_abstract = "Coming soon"
-            if "event_type" in session:
-                session_track = session["event_type"]
-            if "event_subtype" in session:
-                session_sub_track = session["event_subtype"]
-            if "description" in session:
-                session_abstract = session["description"]
-            if "venue" in session:
-                session_room = session["venue"]
-            if "speakers" in session:
-                session_speakers = session["speakers"].split(",")
-
-            # Used to determine whether to skip this session
-            skip_session = False
-            # Check the session track is not in the blacklisted tracks
+            session_track = session.get("event_type")
+            # Skip blacklisted tracks and sessions without a session id in their title
+            post_name = None
             if session_track not in self.blacklistedTracks:
-                # Get the session id from the title
-                session_id_regex = re.compile(
-                    '{0}-[A-Za-z]*[0-9]+K*[0-9]*'.format(self.connect_code.upper()))
-                session_id = session_id_regex.findall(session_title)
-                if len(session_id) == 0:
-                    skip_session = True
-                else:
-                    session_id = session_id[0]
-                    session_name = re.sub(
-                        "{0}-[A-Za-z]*[0-9]+K*[0-9]*".format(self.connect_code.upper()), "", session_title).strip()
-            else:
-                print(session_track)
-                skip_session = True
-
-            if not skip_session:
-                # Gather the session speakers details
-                if session_speakers:
-                    session_speakers_arr = []
-                    for speaker in session_speakers:
-                        speaker_name = speaker.strip()
-                        for speaker_object in users_data:
-                            if speaker_object["name"] == speaker_name:
-                                session_speakers_arr.append(speaker_object)
-                    session_speakers_arr = self.download_speaker_images(
-                        session_speakers_arr)
-                else:
-                    with open("missing_speakers.txt", "a+") as my_file:
-                        my_file.write(session["name"] + "\n")
-                    session_speakers_arr = None
-
-                revised_speakers = []
-                if session_speakers_arr != None:
-                    for speaker in session_speakers_arr:
-                        speaker_details = self.get_speaker_bio(speaker)
-                        speaker_url = ""
-                        if "url" in speaker:
-                            speaker_url = speaker["url"]
-
-                        revised_speakers.append({
-                            "speaker_name": speaker_details["name"],
-                            "speaker_username": speaker_details["username"],
-                            "speaker_url": speaker_url,
-                            "speaker_company": speaker_details["company"],
-                            "speaker_position": speaker_details["position"],
-                            "speaker_location": speaker_details["location"],
-                            "speaker_image": speaker_details["image"],
-                            "speaker_bio":  "{}".format(speaker_details["bio"]).replace("'", ""),
-                        })
-
-                if session_track:
-                    if session_sub_track:
-                        if "," in session_sub_track:
-                            session_tracks = session_sub_track.split(",")
-                            session_tracks.append(session_track)
-                        else:
-                            if session_sub_track != "":
-                                session_tracks = session_track + ", " + session_sub_track
-                    else:
-                        session_tracks = session_track
-
-
-                session_image = {
-                    "path": "/assets/images/featured-images/san19/" + session_id + ".png",
-                    "featured": "true",
-                }
-
-                session_slot = {
-                    "start_time": session_start_time,
-                    "end_time": session_end_time,
-                }
-
-                post_frontmatter = {
-                    "title": session_id + " - " + session_name,
-                    "session_id": session_id,
-                    "session_speakers": revised_speakers,
-                    "description": "{}".format(session_abstract).replace("'", ""),
-                    "image": session_image,
-                    "session_room": session_room,
-                    "session_slot": session_slot,
-                    "tags": session_tracks,
-                    "categories": [self.connect_code],
-                    "session_track": session_track,
-                    "tag": "session",
-                }
-
-                post_file_name = datetime.datetime.now().strftime(
-                    "%Y-%m-%d") + "-" + session_id.lower() + ".md"
-
-                # Path to the new file
-                post_file_path = self.posts_output_path + post_file_name
-
-                # Edit posts if file already exists
-                created = self.post_tool.write_post(post_frontmatter, "", post_file_name)
-                print("{} has been written!".format(post_file_name))
-
+                post_name = session_post_name(session, self.connect_code)
+            if post_name is None:
+                self.metrics.incr("sessions_skipped")
+                self.metrics.event("Skipping {}".format(session_title), track=session_track)
+                continue
+            session_id, session_name, post_file_name = post_name
+
+            # Gather the session speakers details
+            speakers = []
+            if "speakers" in session:
+                for speaker in session["speakers"].split(","):
+                    for user in users_by_name.get(speaker.strip(), []):
+                        speakers.append((user, self.get_speaker_details(user["username"]),
+                                         self.get_speaker_image(user["avatar"])))
             else:
-                print("Skipping {}".format(session_title))
-
-
-    def get_speaker_bio(self, speaker):
+                with open("missing_speakers.txt", "a+") as my_file:
+                    my_file.write(session_title + "\n")
+
+            # Queue the raw records, the posts are built when they are written
+            posts[session_id] = (self.connect_code, session, speakers, post_file_name)
+        self.metrics.record("join", time.perf_counter() - join_started)
+
+        # Diff the posts against the output directory and apply the plan in one batch
+        self.manifest.refresh()
+        plan = plan_posts(posts, self.manifest, prune=prune)
+        applied = apply_plan(plan, self.post_tool, dry_run=self.dry_run, builder=build_session_post)
+        self.metrics.event(
+            "Plan: {create} create, {update} update, {rename} rename, {delete} delete".format(
+                **applied["actions"]), **applied["actions"])
+        if applied["written"]:
+            written = applied["written"]
+            for result in written["results"]:
+                if result["error"]:
+                    self.metrics.incr("write_errors")
+                    self.metrics.event("Failed to write {}: {}".format(
+                        result["file_name"], result["error"]), path=result["file_name"])
+            self.manifest.refresh()
+            self.manifest.save()
+        return posts
+
+    def generate_resources_json_file(self, posts, prune=False):
+        """
+            Updates the resources data file with an entry per session post.
+            Only the entries of the given posts are updated unless prune is True, when
+            entries for sessions not in posts are removed.
+        """
+        entries = []
+        for session_id, (connect_code, session, speakers, post_file_name) in posts.items():
+            post_frontmatter = session_front_matter(session, connect_code)
+            entries.append({
+                "session_id": session_id,
+                "title": post_frontmatter["title"],
+                "session_speakers": [user["name"] for user, details, image in speakers],
+                "session_track": post_frontmatter["session_track"],
+                "tags": post_frontmatter["tags"],
+                "session_room": post_frontmatter["session_room"],
+                "session_slot": post_frontmatter["session_slot"],
+                "image": post_frontmatter["image"]["path"],
+                "post": post_file_name,
+            })
+        changes = self.resources_data_file.update(entries, prune=prune, dry_run=self.dry_run)
+        self.metrics.event(
+            "Resources: {0} added, {1} updated, {2} removed".format(
+                len(changes["added"]), len(changes["updated"]), len(changes["removed"])),
+            path=self.resources_data_file.path)
+        return changes
+
+
+    def prefetch_speaker_details(self, usernames):
+        """
+        Fetches the details of every username not already fetched this run concurrently
+        over the pooled session, with at most max_concurrent_requests in flight
+        """
+        usernames = [username for username in set(usernames)
+                     if (self.sched_url, username) not in self.speaker_details]
+        if not usernames:
+            return
+        with futures.ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as executor:
+            list(executor.map(self.get_speaker_details, usernames))
+
+    def fetch_speaker_details(self, username):
         """
-        Gets a speaker bio given a speaker speaker object
+        Gets the details of a speaker from the sched.com API given their username
         """
         # Construct the API Query with the username added.
         api_query = "/api/user/get?api_key={0}&by=username&term=" + \
-            speaker["username"] + "&format=json"
-        # Get the speaker details
-        speaker_details = self.get_api_results(api_query)
-
-        speaker["bio"] = speaker_details["about"]
-        try:
-            speaker_url = speaker_details['url']
-        except KeyError as e:
-            speaker_url = ""
-        speaker["url"] = speaker_url
-
-        return speaker
-
-    def download_speaker_images(self, session_speakers_arr):
+            username + "&format=json"
+        refresh = username in self.stale_speakers
+        details = self.get_api_results(api_query, refresh=refresh)
+        if refresh and details is not False:
+            self.stale_speakers.discard(username)
+        return details
+
+    def get_speaker_details(self, username):
         """
-            Downloads the session speaker images based on an array of speakers passed in
-            Returns: speakers array with downloaded image paths
+        Gets the details of a speaker given their username, or {} if they could not be fetched
         """
-        for speaker in session_speakers_arr:
-            speaker_avatar_url = speaker["avatar"]
-            if len(speaker_avatar_url) < 3:
-                speaker["image"] = "/assets/images/speakers/placeholder.jpg"
-            else:
-                file_name = self.grab_photo(
-                    speaker_avatar_url, slugify(speaker["name"]))
-                speaker["image"] = self.speaker_image_path + file_name
-        return session_speakers_arr
-
-    def grab_photo(self, url, output_filename):
-        """Fetches attendee photo from the pathable data"""
-        speaker_image_dest = self.images_output_path
-
-        if not os.path.exists(speaker_image_dest):
-            os.makedirs(speaker_image_dest)
-        # Get the filename parsed in
-        file_name = output_filename
-        # Extract the path from the URL
-        path = urlparse(url).path
-        # Get the Extension from the path using os.path.splitext
-        ext = os.path.splitext(path)[1]
-        # Add output folder to output path
-        output = speaker_image_dest + file_name + ext
-
-        if os.path.exists(output):
-            if self._verbose:
-                print("skipping download of photo")
-            return (file_name + ext)
-        else:
-            # Try to download the image and Except errors and return as false.
-            try:
-                opener = request.build_opener()
-                opener.addheaders = [('User-agent', 'Mozilla/5.0')]
-                request.install_opener(opener)
-                image = request.urlretrieve(url, output)
-            except Exception as e:
-                print(e)
-                image = False
+        # Get the speaker details, fetching them if they were not prefetched
+        details = self.speaker_details.get(
+            (self.sched_url, username), lambda: self.fetch_speaker_details(username))
+        return details or {}
 
-        return(file_name + ext)
+    def get_speaker_image(self, speaker_avatar_url):
+        """
+            Downloads a speaker image given the avatar url of the speaker
+            Returns: the path of the downloaded image, or the placeholder image
+        """
+        if len(speaker_avatar_url) >= 3 and speaker_avatar_url not in self.speaker_images:
+            self.speaker_images[speaker_avatar_url] = self.image_downloader.download(
+                speaker_avatar_url)
+        file_name = self.speaker_images.get(speaker_avatar_url)
+        if file_name:
+            return self.speaker_image_path + file_name
+        return "/assets/images/speakers/placeholder.jpg"
 
 
 if __name__ == "__main__":
-    ConnectSchedJekyllPosts("https://bud20.sched.com",
-                            SCHED_API_KEY, "bud20")
+    if "--watch" in sys.argv:
+        # Keep syncing until interrupted
+        ConnectSchedJekyllPosts("https://bud20.sched.com",
+                                SCHED_API_KEY, "bud20", run=False).watch()
+    else:
+        ConnectSchedJekyllPosts("https://bud20.sched.com",
+                                SCHED_API_KEY, "bud20")
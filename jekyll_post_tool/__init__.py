@@ -1 +1,42 @@
-from .core import *
+import importlib
+
+# Module -> the public names it provides. Names are imported from their module on first use,
+# so importing the package (e.g for the jekyll-post-tool command) doesn't load YAML, sqlite3
+# or the archive modules until something that needs them is used.
+_EXPORTS = {
+    "core": ["POST_CREATED", "POST_UPDATED", "POST_UNCHANGED", "render_post", "create_temp_file",
+             "atomic_write", "FileSystemStorage", "ArchiveStorage", "MemoryStorage",
+             "JekyllPostTool"],
+    "serializers": ["SafeDumper", "YAMLSerializer"],
+    "manifest": ["MANIFEST_VERSION", "PostManifest"],
+    "images": ["ImageDownloader"],
+    "http_cache": ["OfflineCacheMiss", "ResponseCache"],
+    "source_cache": ["SOURCE_CACHE_VERSION", "SourceCache", "file_hash"],
+    "template": ["PostTemplate"],
+    "reconcile": ["ACTION_CREATE", "ACTION_UPDATE", "ACTION_RENAME", "ACTION_DELETE",
+                  "plan_posts", "apply_plan"],
+    "instrumentation": ["NullSink", "PrintSink", "LogSink", "JSONSummarySink", "Metrics"],
+    "reader": ["SafeLoader", "DELIMITER", "TOP_LEVEL_KEY", "CONTINUATION", "LazyPost",
+               "read_front_matter"],
+    "data_file": ["DataFile"],
+    "http_client": ["PRIORITY_BULK", "PRIORITY_LOOKUP", "RETRY_STATUSES", "TokenBucket",
+                    "RateLimitedSession"],
+    "streaming": ["iter_json_array"],
+}
+# Public name -> module it is defined in
+_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_MODULES)
+
+def __getattr__(name):
+    """Imports a public name from its module the first time it is used"""
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+    value = getattr(importlib.import_module("." + module, __name__), name)
+    # Later lookups find the name without calling __getattr__ again
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
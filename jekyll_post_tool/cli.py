@@ -0,0 +1,133 @@
+"""
+Command line entry point that writes a JSONL stream of posts through JekyllPostTool.write_posts.
+
+Each line is a JSON object with front_matter, content and file_name keys:
+
+    {"front_matter": {"title": "A post"}, "content": "Some text", "file_name": "2020-03-23-a-post.md"}
+
+Posts are written in one write_posts batch, so a whole export costs one process start.
+"""
+import re
+import sys
+import json
+import time
+import argparse
+
+def check_file_name(file_name):
+    """Raises ValueError unless file_name is a relative path that stays inside the output"""
+    if not isinstance(file_name, str) or not file_name:
+        raise ValueError("file_name must be a non-empty string")
+    # Checked for both separators so a post can't escape the output on any platform
+    if file_name.startswith(("/", "\\")) or re.match(r"^[A-Za-z]:", file_name):
+        raise ValueError("file_name must be relative: {0!r}".format(file_name))
+    if ".." in re.split(r"[/\\]", file_name):
+        raise ValueError("file_name must not contain ..: {0!r}".format(file_name))
+    return file_name
+
+def parse_post(record):
+    """Turns a (line number, line) record into a (front_matter, content, file_name) tuple
+
+    A missing content is left as None, so render_post fills it in from the template or
+    leaves the body empty.
+    """
+    line_number, line = record
+    try:
+        post = json.loads(line)
+        file_name = check_file_name(post["file_name"])
+        return post.get("front_matter") or {}, post.get("content"), file_name
+    except (ValueError, KeyError, AttributeError, TypeError) as e:
+        raise ValueError("line {0}: {1!r}".format(line_number, e))
+
+class Progress:
+
+    """
+    This class reports how many posts have been read and the rate, at most every interval seconds.
+    """
+
+    def __init__(self, stream, interval=1.0):
+
+        self.stream = stream
+        self.interval = interval
+        self.count = 0
+        self._started = time.perf_counter()
+        self._reported = self._started
+
+    def track(self, records):
+        """Passes records through, counting them and reporting progress as they are read"""
+        for record in records:
+            self.count += 1
+            now = time.perf_counter()
+            if self.stream and now - self._reported >= self.interval:
+                self._reported = now
+                self.stream.write("{0} posts read, {1:.0f} posts/sec\n".format(
+                    self.count, self.count / (now - self._started)))
+                self.stream.flush()
+            yield record
+
+def read_records(input_file):
+    """Yields (line number, line) for every non-blank line of a JSONL stream"""
+    for line_number, line in enumerate(input_file, 1):
+        if line.strip():
+            yield line_number, line
+
+def main(argv=None):
+    """Runs the jekyll-post-tool command, returning the exit status"""
+    parser = argparse.ArgumentParser(
+        prog="jekyll-post-tool",
+        description="Writes Jekyll posts from a JSONL stream of "
+                    "{\"front_matter\", \"content\", \"file_name\"} objects.")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="JSONL file to read, - or nothing for stdin")
+    parser.add_argument("-o", "--output", default="output/",
+                        help="directory the posts are written to (default: output/)")
+    parser.add_argument("--archive",
+                        help="write the posts into this .tar, .tar.gz, .tar.bz2, .tar.xz or .zip "
+                             "archive instead of a directory")
+    parser.add_argument("--template", help="markdown template providing default front matter")
+    parser.add_argument("--hash-file", help="sidecar recording the hash of every post written")
+    parser.add_argument("--durable", action="store_true", help="fsync posts before renaming them")
+    parser.add_argument("--workers", type=int, help="number of writer threads")
+    parser.add_argument("--processes", type=int, help="number of processes to render posts in")
+    parser.add_argument("--progress", type=float, default=1.0,
+                        help="seconds between progress reports (default: 1)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="only report errors")
+    args = parser.parse_args(argv)
+
+    from .core import JekyllPostTool, ArchiveStorage
+
+    options = {
+        "output": args.output,
+        "template": args.template,
+        "hash_file": args.hash_file,
+        "durable": args.durable,
+    }
+    if args.archive:
+        options["storage"] = ArchiveStorage(args.archive)
+    if args.workers:
+        options["max_workers"] = args.workers
+    post_tool = JekyllPostTool(options)
+
+    input_file = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    progress = Progress(None if args.quiet else sys.stderr, args.progress)
+    try:
+        # Lines are parsed by the builder, in the render processes when there are any
+        written = post_tool.write_posts(
+            progress.track(read_records(input_file)), processes=args.processes, builder=parse_post)
+    finally:
+        post_tool.close()
+        if input_file is not sys.stdin:
+            input_file.close()
+
+    errors = [result for result in written["results"] if result["error"]]
+    for result in errors:
+        sys.stderr.write("Failed to write {0}: {1}\n".format(
+            result["file_name"] or "post", result["error"]))
+    if not args.quiet:
+        sys.stderr.write(
+            "{0} posts in {1:.2f}s, {2:.0f} posts/sec: "
+            "{3[created]} created, {3[updated]} updated, {3[unchanged]} unchanged, "
+            "{4} failed\n".format(
+                len(written["results"]), written["timings"]["total"],
+                written["timings"]["posts_per_second"], written["counts"], len(errors)))
+    return 1 if errors else 0
@@ -1,7 +1,315 @@
+import io
 import os
-import frontmatter
-import datetime
-from slugify import slugify
+import json
+import time
+import hashlib
+import threading
+from concurrent import futures
+
+from .serializers import YAMLSerializer
+from .template import PostTemplate
+from .instrumentation import Metrics, PrintSink, NullSink
+
+# Results returned by JekyllPostTool.write_post
+POST_CREATED = "created"
+POST_UPDATED = "updated"
+POST_UNCHANGED = "unchanged"
+
+def render_post(serializer, template, front_matter, content):
+    """Renders a post to bytes, filling in the template defaults if a template path is given"""
+    if template:
+        front_matter, template_content = PostTemplate.load(template).new_post(front_matter)
+        if content is None:
+            content = template_content
+    if content is None:
+        content = ""
+    return serializer.serialize(front_matter, content).encode("utf-8")
+
+# Per process state of render workers, set by _init_render_worker
+_render_worker = None
+
+def _init_render_worker(serializer, template, builder):
+    """Stores the serializer, template and builder once per worker process"""
+    global _render_worker
+    _render_worker = (serializer, template, builder)
+
+def _render_in_worker(record):
+    """Builds and renders a post in a worker process, returning (file_name, rendered, error)"""
+    serializer, template, builder = _render_worker
+    file_name = None
+    try:
+        front_matter, content, file_name = builder(record) if builder else record
+        return file_name, render_post(serializer, template, front_matter, content), None
+    except Exception as e:
+        return file_name, None, e
+
+def _build_job(builder, record):
+    """Builds a write_posts job for a post rendered in the writer threads"""
+    if not builder:
+        front_matter, content, file_name = record
+        return file_name, front_matter, content, None, None
+    try:
+        front_matter, content, file_name = builder(record)
+    except Exception as e:
+        return None, None, None, None, e
+    return file_name, front_matter, content, None, None
+
+def create_temp_file(directory, prefix=".", suffix=".tmp"):
+    """Creates a uniquely named file in directory, returning (fd, path)
+
+    Unlike tempfile.mkstemp the file gets the permissions open() would give it (0666 less
+    the umask), so it can be renamed over a post without reading or changing the umask.
+    """
+    while True:
+        path = os.path.join(directory, prefix + os.urandom(8).hex() + suffix)
+        try:
+            return os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o666), path
+        except FileExistsError:
+            continue
+
+def atomic_write(path, data, durable=False):
+    """Writes data to a temporary file next to path and renames it into place
+
+    Readers such as a running `jekyll serve` only ever see the old or the new file.
+    """
+    fd, temp_path = create_temp_file(os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(data)
+            if durable:
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+class FileSystemStorage:
+
+    """
+    This class stores posts as files in a directory, the default JekyllPostTool storage.
+
+    Every storage has a path, and stat, read, write, remove, location, relative, sync and
+    close methods taking post file names relative to the storage.
+    """
+
+    def __init__(self, path, durable=False):
+
+        self.path = os.path.join(path, "")
+        # fsync posts to disk before they are renamed into place
+        self.durable = durable
+        # Check to see if the output path exists and create if not
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+    def location(self, file_name):
+        """Returns where a post is stored, for messages"""
+        return self.path + file_name
+
+    def relative(self, path):
+        """Returns the file name of a post given its path"""
+        return os.path.relpath(path, self.path)
+
+    def stat(self, file_name):
+        """Returns (size, mtime_ns) of a post, or None if it does not exist"""
+        try:
+            stat = os.stat(self.path + file_name)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def read(self, file_name):
+        """Returns the bytes of a post, or None if it does not exist"""
+        try:
+            with open(self.path + file_name, "rb") as post_file:
+                return post_file.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, file_name, data):
+        """Atomically replaces a post, creating its directory if it is in a subdirectory"""
+        directory = os.path.dirname(file_name)
+        if directory:
+            os.makedirs(self.path + directory, exist_ok=True)
+        atomic_write(self.path + file_name, data, self.durable)
+
+    def remove(self, file_name):
+        """Removes a post, returning False if it did not exist"""
+        try:
+            os.remove(self.path + file_name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def sync(self):
+        """fsyncs the output directory so that renames into it are durable"""
+        dir_fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def close(self):
+        """Nothing to do for files"""
+
+class ArchiveStorage:
+
+    """
+    This class streams posts into a single tar or zip archive.
+
+    The format is taken from the extension of path (.tar, .tar.gz/.tgz, .tar.bz2, .tar.xz or
+    .zip) unless given. Posts are appended as they are written, so a large regeneration
+    becomes one sequential write instead of thousands of file creates. The archive is built
+    next to path and only moved into place by close(). Archives are write only: posts cannot
+    be read back or removed. A post rewritten with different content is stored twice, and the
+    last copy wins when a tar archive is extracted.
+    """
+
+    def __init__(self, path, format=None, prefix="", mtime=None):
+
+        self.path = path
+        # Directory the posts are stored under inside the archive
+        self.prefix = prefix
+        # Modification time of every member, fixed for reproducible artifacts
+        self.mtime = time.time() if mtime is None else mtime
+        self.format = format or self._format(path)
+        # File name -> (size, mtime_ns, sha256) of the posts written so far
+        self._written = {}
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path) or "."
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        fd, self._temp_path = create_temp_file(directory)
+        os.close(fd)
+        # The archive modules are only imported when an archive is written
+        if self.format == "zip":
+            import zipfile
+            self._archive = zipfile.ZipFile(self._temp_path, "w", zipfile.ZIP_DEFLATED)
+        else:
+            # Stream mode never seeks, so members are written out as they arrive
+            import tarfile
+            self._archive = tarfile.open(self._temp_path, "w|" + self.format)
+
+    @staticmethod
+    def _format(path):
+        """Works out the archive format from a file name"""
+        if path.endswith(".zip"):
+            return "zip"
+        if path.endswith((".tar.gz", ".tgz")):
+            return "gz"
+        if path.endswith((".tar.bz2", ".tbz2")):
+            return "bz2"
+        if path.endswith((".tar.xz", ".txz")):
+            return "xz"
+        return ""
+
+    def location(self, file_name):
+        """Returns where a post is stored, for messages"""
+        return "{}:{}".format(self.path, self.prefix + file_name)
+
+    def relative(self, path):
+        """Returns the file name of a post given its path"""
+        return path
+
+    def stat(self, file_name):
+        """Returns (size, mtime_ns) of a post written to the archive, or None"""
+        written = self._written.get(file_name)
+        return written and written[:2]
+
+    def read(self, file_name):
+        """Posts cannot be read back from the archive"""
+        return None
+
+    def write(self, file_name, data):
+        """Appends a post to the archive"""
+        name = self.prefix + file_name
+        digest = hashlib.sha256(data).digest()
+        with self._lock:
+            # Writing the same post again would only add a duplicate member
+            written = self._written.get(file_name)
+            if written and written[2] == digest:
+                return
+            if self.format == "zip":
+                import zipfile
+                info = zipfile.ZipInfo(name, time.localtime(self.mtime)[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = (0o644 | 0o100000) << 16
+                self._archive.writestr(info, data)
+            else:
+                import tarfile
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = self.mtime
+                info.mode = 0o644
+                self._archive.addfile(info, io.BytesIO(data))
+            self._written[file_name] = (len(data), time.time_ns(), digest)
+
+    def remove(self, file_name):
+        """Posts cannot be removed from an archive"""
+        if file_name in self._written:
+            raise ValueError("{} is already in {} and cannot be removed".format(file_name, self.path))
+        return False
+
+    def sync(self):
+        """The archive is only durable once closed"""
+
+    def close(self):
+        """Finishes the archive and moves it into place"""
+        with self._lock:
+            if self._archive is None:
+                return
+            self._archive.close()
+            self._archive = None
+            os.replace(self._temp_path, self.path)
+
+class MemoryStorage:
+
+    """
+    This class keeps posts in a dict, for tests and for callers that want the rendered posts.
+    """
+
+    def __init__(self):
+
+        self.path = ""
+        # File name -> rendered bytes
+        self.files = {}
+        # File name -> (size, mtime_ns)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def location(self, file_name):
+        """Returns where a post is stored, for messages"""
+        return file_name
+
+    def relative(self, path):
+        """Returns the file name of a post given its path"""
+        return path
+
+    def stat(self, file_name):
+        """Returns (size, mtime_ns) of a post, or None if it does not exist"""
+        return self._stats.get(file_name)
+
+    def read(self, file_name):
+        """Returns the bytes of a post, or None if it does not exist"""
+        return self.files.get(file_name)
+
+    def write(self, file_name, data):
+        """Stores a post"""
+        with self._lock:
+            self.files[file_name] = data
+            self._stats[file_name] = (len(data), time.time_ns())
+
+    def remove(self, file_name):
+        """Removes a post, returning False if it did not exist"""
+        with self._lock:
+            self._stats.pop(file_name, None)
+            return self.files.pop(file_name, None) is not None
+
+    def sync(self):
+        """Nothing to do in memory"""
+
+    def close(self):
+        """Nothing to do in memory"""
 
 class JekyllPostTool:
 
@@ -12,57 +320,237 @@ class JekyllPostTool:
     def __init__(self, options, verbose=False):
 
         self._verbose = verbose
-        # Set the output path
-        if "output" in options:
-            if options["output"].endswith("/"):
-                self.output_path = options["output"]
-            else:
-                self.output_path = options["output"] + "/"
-        else:
-            self.output_path = os.getcwd() + "/output"
-        # Check to see if the output path exists and create if not
-        if not os.path.exists(self.output_path):
-            os.makedirs(self.output_path)
+        # Timings, counters and messages, printed when verbose unless a Metrics is supplied
+        self.metrics = options.get("metrics") or Metrics(PrintSink() if verbose else NullSink())
+        # Number of threads used by write_posts
+        self.max_workers = options.get("max_workers", min(32, (os.cpu_count() or 1) + 4))
+        # fsync posts to disk before they are renamed into place
+        self.durable = options.get("durable", False)
+        # Where posts are written, a directory unless another storage is given
+        self.storage = options.get("storage") or FileSystemStorage(
+            options.get("output", os.path.join(os.getcwd(), "output")), durable=self.durable)
+        self.output_path = self.storage.path
+        # Serializer used to render posts, anything with a serialize(front_matter, content) method
+        self.serializer = options.get("serializer") or YAMLSerializer()
+        # Optional template providing default front matter and content for every post
+        self.template = options.get("template")
+        # Worker processes used to render posts in write_posts, None renders in the writer threads
+        self.render_processes = options.get("render_processes")
+        # Number of posts sent to a render process at a time
+        self.render_chunksize = options.get("render_chunksize", 32)
+        # Optional sidecar file recording the hash of every post written
+        self.hash_file = options.get("hash_file")
+        self._hashes = {}
+        self._hashes_lock = threading.Lock()
+        if self.hash_file and os.path.exists(self.hash_file):
+            with open(self.hash_file, "r") as hash_file:
+                self._hashes = json.load(hash_file)
 
     def write_post(self, front_matter, content, file_name, remove_old=False):
         """Creates Jekyll markdown post
 
+        The post is rendered in memory and compared against the existing file so that
+        unchanged posts are not rewritten and keep their modification time. Changed posts
+        are written to a temporary file and renamed into place so a crash never leaves a
+        truncated post behind.
+
         Parameters
         ----------
         front_matter : dict/json
             A dict/json object containing the values to be used in the front matter of the post.
         content : text
             The text content of a post. This can contain newline characters and markdown formatting.
+            If a template is configured, None uses the template's content.
         file_name: string
             The output file name of the post e.g 2019-12-12-my-new-jekyll-post.md
 
         Returns
         -------
-        boolean: returns True if the file was written successfully and returns False if not.
+        string: POST_CREATED, POST_UPDATED or POST_UNCHANGED depending on what was done to the file.
 
         """
-        if remove_old:
-            os.remove(remove_old)
-        # Create the output path
-        output_file_path = self.output_path + file_name
-        # New post var with a higher scope
-        new_post = None
-        # Create a new frontmatter object
-        with open(output_file_path, "w+") as new_post_file:
-            new_post = frontmatter.loads(new_post_file.read())
-            # Set the front matter
-            new_post.metadata = front_matter
-            # Set the content
-            new_post.content = content
-        # Write the New file
-        with open(output_file_path, "w+") as new_post_file:
-            new_post_file.writelines(frontmatter.dumps(new_post))
-
-        if self._verbose:
-            print("File written to {}".format(output_file_path))
+        return self._write_post(front_matter, content, file_name, remove_old, sync_dir=self.durable)
+
+    def _write_post(self, front_matter, content, file_name, remove_old=False, sync_dir=False,
+                    rendered=None):
+        """Renders a post in memory and atomically replaces the stored post if it has changed"""
+        output_file_path = self.storage.location(file_name)
+        # Render the post in memory unless it was rendered by a worker process
+        if rendered is None:
+            with self.metrics.timer("render"):
+                rendered = render_post(self.serializer, self.template, front_matter, content)
+        with self.metrics.timer("write"):
+            digest = hashlib.sha256(rendered).hexdigest()
+            # Work out whether the post needs writing
+            status = self._post_status(file_name, rendered, digest)
+            if status != POST_UNCHANGED:
+                self.storage.write(file_name, rendered)
+                if sync_dir:
+                    self.storage.sync()
+                self.metrics.incr("bytes_written", len(rendered))
+            else:
+                self.metrics.incr("files_skipped")
+            self._record_hash(file_name, digest)
+        self.metrics.incr("posts_" + status)
+        # Only remove the old post once the new one is safely in place
+        if remove_old and self.storage.relative(remove_old) != file_name:
+            old_file_name = self.storage.relative(remove_old)
+            self.storage.remove(old_file_name)
+            with self._hashes_lock:
+                self._hashes.pop(old_file_name, None)
+
+        self.metrics.event("File {} at {}".format(status, output_file_path),
+                           status=status, path=output_file_path)
 
+        return status
+
+    def remove_post(self, file_name):
+        """Removes a post from the output path
+
+        Returns
+        -------
+        boolean: returns True if the post was removed and False if it did not exist.
+
+        """
+        if not self.storage.remove(file_name):
+            return False
+        with self._hashes_lock:
+            self._hashes.pop(file_name, None)
+        self.metrics.incr("posts_removed")
+        self.metrics.event("File removed at {}".format(self.storage.location(file_name)),
+                           status="removed", path=self.storage.location(file_name))
         return True
 
+    def _post_status(self, file_name, rendered, digest):
+        """Compares a rendered post against the stored post"""
+        stat = self.storage.stat(file_name)
+        if stat is None:
+            return POST_CREATED
+        # Trust the sidecar hash if the file has not been touched since it was recorded
+        recorded = self._hashes.get(file_name)
+        if recorded and recorded == [stat[0], stat[1], digest]:
+            return POST_UNCHANGED
+        if stat[0] == len(rendered) and self.storage.read(file_name) == rendered:
+            return POST_UNCHANGED
+        return POST_UPDATED
+
+    def _record_hash(self, file_name, digest):
+        """Records the hash of a post in the sidecar if one is configured"""
+        if not self.hash_file:
+            return
+        size, mtime_ns = self.storage.stat(file_name)
+        with self._hashes_lock:
+            self._hashes[file_name] = [size, mtime_ns, digest]
+
+    def save_hashes(self):
+        """Writes the post hashes to the hash_file sidecar if one is configured"""
+        if not self.hash_file:
+            return False
+        with self._hashes_lock:
+            data = json.dumps(self._hashes, sort_keys=True).encode("utf-8")
+        atomic_write(self.hash_file, data, self.durable)
+        return True
+
+    def close(self):
+        """Closes the storage, which finishes the output archive if one is being written"""
+        self.storage.close()
+
+    def write_posts(self, posts, max_workers=None, processes=None, chunksize=None, builder=None):
+        """Creates many Jekyll markdown posts using a bounded pool of writer threads
+
+        Parameters
+        ----------
+        posts : iterable
+            An iterable of (front_matter, content, file_name) tuples, or of records that
+            builder turns into them. It is consumed lazily so generators can be passed in
+            without materialising the whole event.
+        max_workers: int
+            The number of writer threads to use. Defaults to the max_workers option.
+        processes: int
+            The number of worker processes to render posts in. Defaults to the render_processes
+            option; when neither is set posts are rendered in the writer threads.
+        chunksize: int
+            The number of posts sent to a render process at a time. Defaults to the
+            render_chunksize option.
+        builder: callable
+            Optional module level function turning a record into a (front_matter, content,
+            file_name) tuple. With processes it runs in the workers, so only the compact
+            records are sent to them.
+
+        Returns
+        -------
+        dict: {"results": [...], "counts": {...}, "timings": {...}} where results holds a dict
+            per post (in input order) with the file_name, the write_post result, any error and
+            the seconds taken, counts holds the number of created/updated/unchanged posts and
+            timings holds the total, mean and max seconds and posts/sec.
+
+        """
+        max_workers = max_workers or self.max_workers
+        processes = processes or self.render_processes
+        results = []
+        counts = {POST_CREATED: 0, POST_UPDATED: 0, POST_UNCHANGED: 0}
+        start = time.perf_counter()
+        pool = None
+        if processes:
+            # Render in worker processes, the results come back in input order
+            import multiprocessing
+            pool = multiprocessing.Pool(
+                processes, initializer=_init_render_worker,
+                initargs=(self.serializer, self.template, builder))
+            jobs = ((file_name, None, None, rendered, error) for file_name, rendered, error in
+                    pool.imap(_render_in_worker, posts, chunksize or self.render_chunksize))
+        else:
+            jobs = (_build_job(builder, post) for post in posts)
+        try:
+            with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                in_flight = set()
+                for index, job in enumerate(jobs):
+                    results.append(None)
+                    in_flight.add(executor.submit(self._timed_write, index, *job))
+                    # Bound the number of queued posts so large streams are not buffered in memory
+                    if len(in_flight) >= max_workers * 2:
+                        done, in_flight = futures.wait(in_flight, return_when=futures.FIRST_COMPLETED)
+                        for future in done:
+                            index, result = future.result()
+                            results[index] = result
+                for future in futures.as_completed(in_flight):
+                    index, result = future.result()
+                    results[index] = result
+        finally:
+            # Every rendered post has been consumed (or writing failed), so stop the workers
+            if pool:
+                pool.terminate()
+                pool.join()
+        # A single directory fsync covers every rename in the batch
+        if self.durable:
+            self.storage.sync()
+        self.save_hashes()
+        total = time.perf_counter() - start
+        for result in results:
+            if result["result"] in counts:
+                counts[result["result"]] += 1
+        post_times = [result["seconds"] for result in results]
+        timings = {
+            "total": total,
+            "mean": sum(post_times) / len(post_times) if post_times else 0.0,
+            "max": max(post_times) if post_times else 0.0,
+            "posts_per_second": len(results) / total if total else 0.0,
+        }
+        return {"results": results, "counts": counts, "timings": timings}
+
+    def _timed_write(self, index, file_name, front_matter, content, rendered=None, error=None):
+        """Writes a single post for write_posts, capturing the result, error and duration"""
+        start = time.perf_counter()
+        result = {"file_name": file_name, "result": False, "error": error}
+        if error is None:
+            try:
+                result["result"] = self._write_post(
+                    front_matter, content, file_name, rendered=rendered)
+            except Exception as e:
+                result["error"] = e
+        result["seconds"] = time.perf_counter() - start
+        return index, result
+
 if __name__ == "__main__":
 
     post_tool = JekyllPostTool({"output": "assets/output/"}, verbose=True)
@@ -0,0 +1,109 @@
+import os
+import json
+from .core import create_temp_file
+
+class DataFile:
+
+    """
+    This class maintains a Jekyll data file holding a JSON array of entries.
+
+    Entries are keyed by one of their fields (session_id by default) and written one per line,
+    sorted by key, so the file only changes where entries changed and diffs stay small.
+    Updates are merged into the existing file and it is only rewritten, atomically, when an
+    entry was added, changed or removed.
+    """
+
+    def __init__(self, path, key="session_id"):
+
+        self.path = path
+        self.key = key
+
+    def load(self):
+        """Reads the data file
+
+        Returns
+        -------
+        dict: key -> (entry, line) where line is the entry as it was last written, or
+        None if the file was not written by this class.
+
+        """
+        entries = {}
+        try:
+            data_file = open(self.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return entries
+        with data_file:
+            try:
+                # Entries are one per line so each is decoded on its own and kept as written
+                for line in data_file:
+                    line = line.strip().rstrip(",")
+                    if line in ("[", "]", ""):
+                        continue
+                    entry = json.loads(line)
+                    entries[str(entry[self.key])] = (entry, line)
+            except (ValueError, KeyError, TypeError):
+                # Not one entry per line, so read the whole array
+                data_file.seek(0)
+                entries = {}
+                for entry in json.load(data_file):
+                    entries[str(entry[self.key])] = (entry, None)
+        return entries
+
+    def update(self, entries, prune=False, dry_run=False):
+        """Merges entries into the data file, rewriting it only if anything changed
+
+        Parameters
+        ----------
+        entries : iterable
+            The new or changed entries, each a dict containing the key.
+        prune : boolean
+            Remove entries that are not in entries, for when every entry is passed.
+        dry_run : boolean
+            Work out the changes without writing the file.
+
+        Returns
+        -------
+        dict: the keys that were added, updated and removed.
+
+        """
+        existing = self.load()
+        changes = {"added": [], "updated": [], "removed": []}
+        seen = set()
+        for entry in entries:
+            key = str(entry[self.key])
+            seen.add(key)
+            if key not in existing:
+                changes["added"].append(key)
+            elif existing[key][0] == entry:
+                continue
+            else:
+                changes["updated"].append(key)
+            existing[key] = (entry, None)
+        if prune:
+            for key in set(existing) - seen:
+                changes["removed"].append(key)
+                del existing[key]
+        if not dry_run and (any(changes.values()) or not os.path.exists(self.path)):
+            self._write(existing)
+        return changes
+
+    def _write(self, entries):
+        """Streams the entries to a temporary file and moves it over the data file"""
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = create_temp_file(directory)
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as data_file:
+                data_file.write("[\n")
+                keys = sorted(entries)
+                for index, key in enumerate(keys):
+                    entry, line = entries[key]
+                    # Unchanged entries are written back exactly as they were read
+                    if line is None:
+                        line = json.dumps(entry, sort_keys=True, ensure_ascii=False)
+                    data_file.write("  " + line + (",\n" if index < len(keys) - 1 else "\n"))
+                data_file.write("]\n")
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
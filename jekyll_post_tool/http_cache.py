@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from .instrumentation import Metrics
+from .streaming import iter_json_array
+
+class OfflineCacheMiss(Exception):
+
+    """
+    Raised when a response is requested in offline mode but is not in the cache.
+    """
+
+class ResponseCache:
+
+    """
+    This class caches JSON API responses on disk.
+
+    Responses are keyed by URL with secrets such as the API key redacted. Fresh entries
+    (younger than ttl seconds) are served without touching the network, stale entries are
+    revalidated with ETag / Last-Modified and the least recently used entries are evicted
+    once the cache grows past max_bytes. In offline mode only cached responses are served.
+    Large list responses can be streamed with fetch_records, which stores the body in a file
+    of its own so it is never held in memory, from the network or from the cache.
+    """
+
+    def __init__(self, directory, ttl=300, max_bytes=50 * 1024 * 1024, offline=False,
+                 redact=("api_key",), metrics=None):
+
+        self.directory = directory
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.redact = set(redact)
+        self.metrics = metrics or Metrics()
+        # Counters for the current run
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        # File name -> [last used, size] of every entry, built on first use
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def key(self, url):
+        """Returns the cache key for a URL with any redacted query parameters removed"""
+        parts = urlsplit(url)
+        query = [(name, "REDACTED" if name in self.redact else value)
+                 for name, value in parse_qsl(parts.query, keep_blank_values=True)]
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+    def fetch(self, session, url, refresh=False, **kwargs):
+        """Gets the JSON response for a URL, from the cache where possible
+
+        Parameters
+        ----------
+        session : requests.Session
+            The session used for any requests that have to be made.
+        url : string
+            The URL to fetch.
+        refresh : boolean
+            Revalidate a fresh cached response with the server instead of serving it, unless
+            offline, for when the response has to be current as of this call.
+
+        Returns
+        -------
+        The decoded JSON response.
+
+        """
+        key = self.key(url)
+        path = self._path(key)
+        entry = self._load(path)
+        fresh = entry and not refresh and time.time() - entry["fetched_at"] < self.ttl
+        if entry and (self.offline or fresh):
+            self.hits += 1
+            self.metrics.incr("cache_hits")
+            self._touch(path, entry)
+            return self._decode(entry)
+        if self.offline:
+            raise OfflineCacheMiss(key)
+        headers = self._conditional_headers(entry, kwargs.pop("headers", {}))
+        with self.metrics.timer("fetch"):
+            resp = session.get(url, headers=headers, **kwargs)
+        self.metrics.incr("api_calls")
+        if resp.status_code == 304 and entry:
+            self.revalidated += 1
+            self.metrics.incr("cache_revalidated")
+            entry["fetched_at"] = time.time()
+        else:
+            resp.raise_for_status()
+            self.misses += 1
+            self.metrics.incr("cache_misses")
+            entry = {
+                "key": key,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+                "body": resp.text,
+            }
+        self._store(path, entry)
+        self._track(path)
+        self.evict()
+        return self._decode(entry)
+
+    def fetch_records(self, session, url, chunk_size=65536, refresh=False, **kwargs):
+        """Yields the records of a JSON array response one at a time, from the cache where possible
+
+        The response is parsed as it downloads and written to the cache as it goes, so only
+        one record is held in memory at a time. A response is only cached once it has been
+        read to the end.
+
+        Parameters
+        ----------
+        session : requests.Session
+            The session used for any requests that have to be made.
+        url : string
+            The URL to fetch, which must return a JSON array.
+        chunk_size : int
+            The number of bytes read at a time.
+        refresh : boolean
+            Revalidate a fresh cached response with the server instead of serving it, unless
+            offline.
+
+        Returns
+        -------
+        generator: the decoded records.
+
+        """
+        key = self.key(url)
+        path = self._path(key)
+        entry = self._load(path)
+        fresh = entry and not refresh and time.time() - entry["fetched_at"] < self.ttl
+        if entry and (self.offline or fresh):
+            self.hits += 1
+            self.metrics.incr("cache_hits")
+            self._touch(path, entry)
+            yield from self._iter_entry(entry, chunk_size)
+            return
+        if self.offline:
+            raise OfflineCacheMiss(key)
+        headers = self._conditional_headers(entry, kwargs.pop("headers", {}))
+        with self.metrics.timer("fetch"):
+            resp = session.get(url, headers=headers, stream=True, **kwargs)
+        self.metrics.incr("api_calls")
+        with resp:
+            if resp.status_code == 304 and entry:
+                self.revalidated += 1
+                self.metrics.incr("cache_revalidated")
+                entry["fetched_at"] = time.time()
+                self._store(path, entry)
+                self._touch(path, entry)
+                yield from self._iter_entry(entry, chunk_size)
+                return
+            resp.raise_for_status()
+            self.misses += 1
+            self.metrics.incr("cache_misses")
+            body_path = path[:-len(".json")] + ".body"
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as body_file:
+                    def chunks():
+                        # Copy the body to the cache as it is parsed
+                        for chunk in resp.iter_content(chunk_size):
+                            body_file.write(chunk)
+                            yield chunk
+                    yield from iter_json_array(chunks())
+                os.replace(temp_path, body_path)
+            except BaseException:
+                # Never cache a partial response, including when the caller stops early
+                os.unlink(temp_path)
+                raise
+        self._store(path, {
+            "key": key,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+            "body_file": os.path.basename(body_path),
+        })
+        self._track(body_path)
+        self._track(path)
+        self.evict()
+
+    def _touch(self, path, entry):
+        """Marks an entry and its body file as recently used"""
+        paths = [path]
+        if "body_file" in entry:
+            paths.append(os.path.join(self.directory, entry["body_file"]))
+        for used_path in paths:
+            os.utime(used_path)
+            self._track(used_path)
+
+    def _conditional_headers(self, entry, headers):
+        """Returns the request headers with the validators of a cached entry added"""
+        headers = dict(headers)
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _decode(self, entry):
+        """Decodes the body of an entry, which may be stored in a file of its own"""
+        if "body" in entry:
+            return json.loads(entry["body"])
+        with open(os.path.join(self.directory, entry["body_file"]), "r", encoding="utf-8") as body_file:
+            return json.load(body_file)
+
+    def _iter_entry(self, entry, chunk_size):
+        """Yields the records of a cached JSON array response"""
+        if "body" in entry:
+            yield from iter_json_array([entry["body"]])
+            return
+        with open(os.path.join(self.directory, entry["body_file"]), "rb") as body_file:
+            yield from iter_json_array(iter(lambda: body_file.read(chunk_size), b""))
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = self._load_entries()
+            total = sum(size for used, size in entries.values())
+            if total <= self.max_bytes:
+                return total
+            for used, size, file_name in sorted(
+                    (used, size, file_name) for file_name, (used, size) in entries.items()):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, file_name))
+                except FileNotFoundError:
+                    pass
+                del entries[file_name]
+                total -= size
+        return total
+
+    def _load_entries(self):
+        """Scans the cache directory once for the size and last use of every entry"""
+        if self._entries is None:
+            self._entries = {}
+            for file_name in os.listdir(self.directory):
+                if file_name.endswith((".json", ".body")):
+                    stat = os.stat(os.path.join(self.directory, file_name))
+                    self._entries[file_name] = [stat.st_mtime, stat.st_size]
+        return self._entries
+
+    def _track(self, path):
+        """Records the size and last use of an entry that was just written or read"""
+        stat = os.stat(path)
+        with self._lock:
+            self._load_entries()[os.path.basename(path)] = [stat.st_mtime, stat.st_size]
+
+    def _path(self, key):
+        """Returns the path of the cache file for a key"""
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _load(self, path):
+        """Loads a cache entry, returning None if it or its body file is missing or unreadable"""
+        try:
+            with open(path, "r", encoding="utf-8") as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        if "body_file" in entry and not os.path.exists(os.path.join(self.directory, entry["body_file"])):
+            return None
+        return entry
+
+    def _store(self, path, entry):
+        """Atomically writes a cache entry"""
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as cache_file:
+            json.dump(entry, cache_file)
+        os.replace(temp_path, path)
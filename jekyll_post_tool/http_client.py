@@ -0,0 +1,175 @@
+import time
+import heapq
+import random
+import itertools
+import threading
+
+from .instrumentation import Metrics
+
+# Request priorities, lower values are sent first
+PRIORITY_BULK = 0
+PRIORITY_LOOKUP = 10
+
+# Responses that are retried, with Retry-After honoured when it is sent
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class TokenBucket:
+
+    """
+    This class hands out request tokens at a sustained rate with bursts of up to burst.
+
+    Waiting callers are served in priority order (then first come first served), so lower
+    priority requests only use the budget that higher priority ones leave free. The rate
+    adapts to the server: it is halved whenever the server throttles and recovers additively
+    on every request allowed through, up to the configured rate.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=0.1):
+
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(min_rate, self.max_rate)
+        self.burst = float(burst or max(1, rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        # No tokens are handed out until then, set when the server asks us to back off
+        self._paused_until = 0.0
+        # Heap of (priority, sequence) of the callers waiting for a token
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def acquire(self, priority=PRIORITY_LOOKUP):
+        """Blocks until a token is available for this caller, returning the seconds waited"""
+        started = time.monotonic()
+        with self._condition:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._waiting[0] == ticket and self._tokens >= 1 and now >= self._paused_until:
+                    heapq.heappop(self._waiting)
+                    self._tokens -= 1
+                    # Let the next caller in line check for a token
+                    self._condition.notify_all()
+                    return now - started
+                delay = max(self._paused_until - now, (1 - self._tokens) / self.rate, 0.001)
+                self._condition.wait(delay)
+
+    def throttled(self, retry_after=None):
+        """Slows the bucket down after the server throttled a request"""
+        with self._condition:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self._condition.notify_all()
+
+    def succeeded(self):
+        """Lets the rate recover towards max_rate after a request was allowed through"""
+        with self._condition:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def _refill(self, now):
+        """Adds the tokens earned since the last refill"""
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+class RateLimitedSession:
+
+    """
+    This class sends HTTP requests through a token bucket over pooled keep-alive connections.
+
+    It has the same get method as a requests.Session, with an extra priority argument, so it
+    can be passed to ResponseCache.fetch. Throttled responses (429) and server errors are
+    retried with jittered exponential backoff, waiting at least as long as any Retry-After
+    header asks, as are connection errors and timeouts.
+    """
+
+    def __init__(self, rate=10, burst=None, session=None, pool_size=8, max_retries=5,
+                 backoff=0.5, max_backoff=60, metrics=None):
+
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.metrics = metrics or Metrics()
+        # Pooled HTTP session so connections are kept alive between requests, requests is
+        # imported when it is first needed to keep the package quick to import
+        import requests
+        self.session = session or requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, priority=PRIORITY_LOOKUP, **kwargs):
+        """Sends a GET request, waiting for a token first and retrying if it fails
+
+        Parameters
+        ----------
+        url : string
+            The URL to get.
+        priority : int
+            Requests with lower values are sent first, e.g PRIORITY_BULK before PRIORITY_LOOKUP.
+
+        Returns
+        -------
+        requests.Response: the response, which is the last one received if every retry failed.
+
+        """
+        return self.request("GET", url, priority=priority, **kwargs)
+
+    def request(self, method, url, priority=PRIORITY_LOOKUP, **kwargs):
+        """Sends a request, waiting for a token first and retrying if it fails"""
+        import requests
+        attempt = 0
+        while True:
+            waited = self.bucket.acquire(priority)
+            self.metrics.record("rate_limit_wait", waited)
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                self.metrics.incr("request_retries")
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            if resp.status_code not in RETRY_STATUSES:
+                self.bucket.succeeded()
+                return resp
+            retry_after = self._retry_after(resp)
+            if resp.status_code == 429:
+                self.metrics.incr("requests_throttled")
+                self.bucket.throttled(retry_after)
+            if attempt >= self.max_retries:
+                return resp
+            self.metrics.incr("request_retries")
+            resp.close()
+            time.sleep(max(self._backoff(attempt), retry_after or 0))
+            attempt += 1
+
+    def _backoff(self, attempt):
+        """Full jitter exponential backoff for a retry"""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _retry_after(self, resp):
+        """Returns the seconds a Retry-After header asks for, or None"""
+        value = resp.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        from email.utils import parsedate_to_datetime
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def close(self):
+        """Closes the pooled connections"""
+        self.session.close()
@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+import mimetypes
+import threading
+from concurrent import futures
+from urllib.parse import urlparse
+
+from .core import atomic_write, create_temp_file
+from .instrumentation import Metrics
+
+class ImageDownloader:
+
+    """
+    This class downloads images such as speaker avatars into a content addressed store.
+
+    Images are fetched in parallel over one pooled HTTP session. The ETag and Last-Modified
+    headers of every URL are kept in a small metadata file so repeat runs only make
+    conditional requests, and files are named by the hash of their content so identical
+    images used by many speakers are only stored once.
+    """
+
+    def __init__(self, output_path, metadata_file=None, session=None, max_workers=8,
+                 user_agent="Mozilla/5.0", metrics=None):
+
+        self.output_path = output_path
+        if not os.path.exists(self.output_path):
+            os.makedirs(self.output_path)
+        # Metadata about each URL downloaded, stored alongside the images by default
+        self.metadata_file = metadata_file or os.path.join(output_path, ".images.json")
+        self.max_workers = max_workers
+        self.metrics = metrics or Metrics()
+        # requests is imported when it is first needed to keep the package quick to import
+        import requests
+        # Sent with image requests only, so a shared session keeps its own User-Agent
+        self.user_agent = user_agent
+        self.session = session
+        if self.session is None:
+            # A session passed in keeps its own connection pool
+            self.session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+        # url -> {"file", "etag", "last_modified"}
+        self.metadata = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.metadata_file):
+            with open(self.metadata_file, "r") as metadata_file:
+                self.metadata = json.load(metadata_file)
+
+    def download(self, url):
+        """Downloads a single image
+
+        Parameters
+        ----------
+        url : string
+            The URL of the image.
+
+        Returns
+        -------
+        string: the file name of the image in output_path, or None if it could not be fetched.
+
+        """
+        import requests
+        entry = self.metadata.get(url)
+        headers = {"User-Agent": self.user_agent}
+        if entry and os.path.exists(os.path.join(self.output_path, entry["file"])):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            with self.metrics.timer("image"):
+                resp = self.session.get(url, headers=headers, timeout=30)
+            self.metrics.incr("image_requests")
+            if resp.status_code == 304:
+                self.metrics.incr("images_not_modified")
+                return entry["file"]
+            resp.raise_for_status()
+        except requests.RequestException as e:
+            self.metrics.incr("image_errors")
+            self.metrics.event(str(e), url=url)
+            # Fall back to the last good copy if there is one
+            return entry["file"] if headers else None
+        self.metrics.incr("image_bytes", len(resp.content))
+        file_name = self._store(resp.content, self._extension(url, resp))
+        with self._lock:
+            self.metadata[url] = {
+                "file": file_name,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+            }
+        return file_name
+
+    def download_many(self, urls):
+        """Downloads images in parallel and saves the metadata file
+
+        Returns
+        -------
+        dict: url -> file name (or None) for every unique URL passed in.
+
+        """
+        urls = list(dict.fromkeys(urls))
+        with futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = dict(zip(urls, executor.map(self.download, urls)))
+        self.save()
+        return results
+
+    def save(self):
+        """Writes the metadata file"""
+        # Held while writing too, as downloaders shared between threads may save at once
+        with self._lock:
+            atomic_write(self.metadata_file,
+                         json.dumps(self.metadata, sort_keys=True).encode("utf-8"))
+        return True
+
+    def _store(self, data, ext):
+        """Writes image data to a file named by its hash unless it is already stored"""
+        file_name = hashlib.sha256(data).hexdigest()[:32] + ext
+        output_file_path = os.path.join(self.output_path, file_name)
+        if not os.path.exists(output_file_path):
+            fd, temp_path = create_temp_file(self.output_path)
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, output_file_path)
+        return file_name
+
+    def _extension(self, url, resp):
+        """Gets the image extension from the URL path, falling back to the Content-Type"""
+        ext = os.path.splitext(urlparse(url).path)[1]
+        if not ext:
+            content_type = resp.headers.get("Content-Type", "").split(";")[0].strip()
+            ext = mimetypes.guess_extension(content_type) or ""
+        return ext.lower()
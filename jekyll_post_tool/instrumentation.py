@@ -0,0 +1,137 @@
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+class NullSink:
+
+    """
+    A sink that discards every event and summary.
+    """
+
+    def event(self, message, fields):
+        pass
+
+    def summary(self, summary):
+        pass
+
+class PrintSink:
+
+    """
+    A sink that prints events, the behaviour of the verbose flag.
+    """
+
+    def event(self, message, fields):
+        print(message)
+
+    def summary(self, summary):
+        for stage, timer in sorted(summary["timers"].items()):
+            print("{0}: {1:.3f}s over {2} calls".format(stage, timer["total"], timer["count"]))
+        for counter, value in sorted(summary["counters"].items()):
+            print("{0}: {1}".format(counter, value))
+
+class LogSink:
+
+    """
+    A sink that sends events and the summary to a logger as structured records.
+    """
+
+    def __init__(self, logger=None):
+
+        if logger is None:
+            # logging is only imported by callers that log
+            import logging
+            logger = logging.getLogger("jekyll_post_tool")
+        self.logger = logger
+
+    def event(self, message, fields):
+        self.logger.info(message, extra={"fields": fields})
+
+    def summary(self, summary):
+        self.logger.info(json.dumps(summary, sort_keys=True), extra={"summary": summary})
+
+class JSONSummarySink:
+
+    """
+    A sink that ignores events and writes the summary of a run to a JSON file.
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+
+    def event(self, message, fields):
+        pass
+
+    def summary(self, summary):
+        with open(self.path, "w") as summary_file:
+            json.dump(summary, summary_file, indent=2, sort_keys=True)
+
+class Metrics:
+
+    """
+    This class collects per stage timings and counters for a run and reports them to a sink.
+
+    Stages are timed with the timer context manager and counters are bumped with incr.
+    Messages that used to be printed go through event so the sink decides what to do with
+    them. Everything is thread safe.
+    """
+
+    def __init__(self, sink=None):
+
+        self.sink = sink or NullSink()
+        # Stage -> {"count", "total", "max"}
+        self.timers = {}
+        # Counter -> value
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._started = time.time()
+
+    @contextmanager
+    def timer(self, stage):
+        """Times the enclosed block and adds it to the stage's totals"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage, seconds):
+        """Adds a duration to a stage's totals"""
+        with self._lock:
+            timer = self.timers.setdefault(stage, {"count": 0, "total": 0.0, "max": 0.0})
+            timer["count"] += 1
+            timer["total"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+
+    def incr(self, counter, value=1):
+        """Adds value to a counter"""
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def event(self, message, **fields):
+        """Reports a message to the sink"""
+        self.sink.event(message, fields)
+
+    def summary(self):
+        """Returns the timers and counters collected so far"""
+        with self._lock:
+            return {
+                "started": self._started,
+                "elapsed": time.time() - self._started,
+                "timers": {stage: dict(timer) for stage, timer in self.timers.items()},
+                "counters": dict(self.counters),
+            }
+
+    def reset(self):
+        """Clears the timers and counters to start a new run, e.g each cycle of a daemon"""
+        with self._lock:
+            self.timers = {}
+            self.counters = {}
+            self._started = time.time()
+
+    def flush(self):
+        """Sends the summary to the sink"""
+        summary = self.summary()
+        self.sink.summary(summary)
+        return summary
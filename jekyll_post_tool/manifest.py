@@ -0,0 +1,141 @@
+import os
+import json
+import hashlib
+from .core import atomic_write
+from .reader import LazyPost
+
+# Bump when the layout of the manifest file changes
+MANIFEST_VERSION = 1
+
+class PostManifest:
+
+    """
+    This class maintains an on-disk index of the Jekyll posts in a directory.
+
+    Each post is recorded with its mtime, size, content hash and the value of a front matter
+    key (session_id by default) so posts can be looked up without globbing and parsing every
+    file. Only files whose mtime or size changed since the last refresh are parsed again.
+    """
+
+    def __init__(self, location, manifest_file=None, key="session_id",
+                 extensions=(".md", ".markdown", ".mdown")):
+
+        self.location = location
+        self.key = key
+        self.extensions = tuple(extensions)
+        # Location of the manifest, stored alongside the posts by default
+        self.manifest_file = manifest_file or os.path.join(location, ".post-manifest.json")
+        # Relative path -> {"mtime", "size", "hash", key}
+        self.files = {}
+        # Front matter key value -> relative path
+        self._index = {}
+        self.load()
+
+    def load(self):
+        """Loads the manifest file if it exists and matches the current version"""
+        try:
+            with open(self.manifest_file, "r") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return False
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("key") != self.key:
+            return False
+        self.files = manifest["files"]
+        self._build_index()
+        return True
+
+    def save(self):
+        """Writes the manifest file"""
+        manifest = {"version": MANIFEST_VERSION, "key": self.key, "files": self.files}
+        atomic_write(self.manifest_file, json.dumps(manifest, sort_keys=True).encode("utf-8"))
+        return True
+
+    def refresh(self):
+        """Walks the post directory once and re-validates any new or changed posts
+
+        Returns
+        -------
+        int: the number of posts that had to be parsed.
+
+        """
+        seen = set()
+        parsed = 0
+        for root, dirs, files in os.walk(self.location):
+            for file_name in files:
+                if not file_name.endswith(self.extensions):
+                    continue
+                path = os.path.join(root, file_name)
+                relative_path = os.path.relpath(path, self.location)
+                seen.add(relative_path)
+                stat = os.stat(path)
+                entry = self.files.get(relative_path)
+                if entry and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                    continue
+                self.files[relative_path] = self._read_entry(path, stat)
+                parsed += 1
+        # Drop posts that no longer exist
+        for relative_path in set(self.files) - seen:
+            del self.files[relative_path]
+        self._build_index()
+        return parsed
+
+    def update(self, path):
+        """Records a post that has just been written, or forgets it if it was removed"""
+        relative_path = os.path.relpath(path, self.location)
+        old_entry = self.files.pop(relative_path, None)
+        if old_entry and self._index.get(old_entry.get(self.key)) == relative_path:
+            del self._index[old_entry[self.key]]
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        entry = self._read_entry(path, stat)
+        self.files[relative_path] = entry
+        if entry.get(self.key) is not None:
+            self._index.setdefault(entry[self.key], relative_path)
+
+    def lookup(self, value):
+        """Returns the path of the post whose front matter key matches value, or None"""
+        relative_path = self._index.get(value)
+        if relative_path is None:
+            return None
+        return os.path.join(self.location, relative_path)
+
+    def paths(self):
+        """Returns the paths of every post in the manifest"""
+        return [os.path.join(self.location, relative_path) for relative_path in sorted(self.files)]
+
+    def paths_by_key(self):
+        """Returns a dict of front matter key value -> list of paths, including duplicates"""
+        grouped = {}
+        for relative_path in sorted(self.files):
+            value = self.files[relative_path].get(self.key)
+            if value is not None:
+                grouped.setdefault(value, []).append(os.path.join(self.location, relative_path))
+        return grouped
+
+    def _read_entry(self, path, stat):
+        """Hashes a post and reads its key from the front matter to build its manifest entry"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as post_file:
+            for chunk in iter(lambda: post_file.read(65536), b""):
+                digest.update(chunk)
+        # Only the key's line of the front matter is parsed, the body is never decoded
+        try:
+            value = LazyPost(path).get(self.key)
+        except Exception:
+            value = None
+        return {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": digest.hexdigest(),
+            self.key: value,
+        }
+
+    def _build_index(self):
+        """Rebuilds the key -> path lookup table"""
+        self._index = {}
+        for relative_path in sorted(self.files):
+            value = self.files[relative_path].get(self.key)
+            if value is not None:
+                self._index.setdefault(value, relative_path)
@@ -0,0 +1,152 @@
+import re
+import yaml
+
+# Use the libyaml backed loader when PyYAML was built against libyaml
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# Front matter delimiter, the same pattern python-frontmatter splits on
+DELIMITER = re.compile(r"^-{3,}\s*$")
+# A top level key in block style YAML front matter
+TOP_LEVEL_KEY = re.compile(r"^('(?:[^']|'')*'|\"(?:[^\"\\]|\\.)*\"|[^\s#'\"\-][^:]*?)\s*:(?:\s|$)")
+# Lines that continue the value of the key above: indented, blank, comments and sequence items
+CONTINUATION = re.compile(r"^(?:[\s#]|-(?:\s|$)|$)")
+# Resolves the type YAML gives a plain key, e.g 1, true and << are not strings
+_RESOLVER = yaml.resolver.Resolver()
+_STR_TAG = "tag:yaml.org,2002:str"
+
+class LazyPost:
+
+    """
+    This class reads a Jekyll post lazily.
+
+    Only the front matter is read when the post is opened, stopping at the closing ---
+    delimiter. The front matter is parsed on first use, get can parse just the keys it is
+    asked for, and the body is only read from disk when content is accessed.
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        self._metadata = None
+        self._content = None
+        # Top level key -> raw YAML of that key, for partial parsing
+        self._blocks = None
+        # False when a top level line could not be split, so keys missing from _blocks
+        # may still be in the front matter
+        self._split_complete = True
+        self._header, self._body_offset = self._read_header()
+
+    def _read_header(self):
+        """Reads the front matter lines and the offset the body starts at"""
+        with open(self.path, "rb") as post_file:
+            offset = 0
+            # Skip leading blank lines like frontmatter's strip()
+            for line in post_file:
+                if line.strip():
+                    break
+                offset += len(line)
+            else:
+                return "", offset
+            if not DELIMITER.match(line.decode("utf-8")):
+                return "", offset
+            offset += len(line)
+            lines = []
+            for line in post_file:
+                offset += len(line)
+                text = line.decode("utf-8")
+                if DELIMITER.match(text):
+                    return "".join(lines), offset
+                lines.append(text)
+        # No closing delimiter, so there is no front matter
+        return "", 0
+
+    @property
+    def metadata(self):
+        """The parsed front matter"""
+        if self._metadata is None:
+            metadata = yaml.load(self._header, Loader=SafeLoader) if self._header else None
+            self._metadata = metadata if isinstance(metadata, dict) else {}
+        return self._metadata
+
+    @property
+    def content(self):
+        """The body of the post, read from disk on first access"""
+        if self._content is None:
+            with open(self.path, "rb") as post_file:
+                post_file.seek(self._body_offset)
+                self._content = post_file.read().decode("utf-8").strip()
+        return self._content
+
+    def __getitem__(self, key):
+        return self.metadata[key]
+
+    def get(self, key, default=None):
+        """Gets a front matter value, parsing only that key's YAML if the rest is not needed"""
+        if self._metadata is not None:
+            return self._metadata.get(key, default)
+        block = self._split_blocks().get(key)
+        if block is None:
+            # Keys the splitter can't match, such as a:b or -k, are found by parsing everything
+            return default if self._split_complete else self.metadata.get(key, default)
+        try:
+            value = yaml.load(block, Loader=SafeLoader)
+        except yaml.YAMLError:
+            value = None
+        if not isinstance(value, dict) or key not in value:
+            # Fall back to parsing everything if the block could not be parsed on its own
+            return self.metadata.get(key, default)
+        return value[key]
+
+    def select(self, keys):
+        """Returns a dict of the requested front matter keys that are present"""
+        missing = object()
+        values = {key: self.get(key, missing) for key in keys}
+        return {key: value for key, value in values.items() if value is not missing}
+
+    def _split_blocks(self):
+        """Splits block style front matter into the raw YAML of each top level key"""
+        if self._blocks is None:
+            self._blocks = {}
+            key = None
+            for line in self._header.splitlines(True):
+                match = TOP_LEVEL_KEY.match(line)
+                if match:
+                    key = match.group(1)
+                    if key[0] in "'\"":
+                        # Quoted keys are unescaped by YAML itself
+                        key = yaml.load(key, Loader=SafeLoader)
+                    elif key[0] in "{[?&*!|>%@`" or _RESOLVER.resolve(
+                            yaml.ScalarNode, key, (True, False)) != _STR_TAG:
+                        # Flow collections, complex keys, anchors, tags and keys that are
+                        # not strings don't name the key the line holds
+                        self._split_complete = False
+                    self._blocks[key] = line
+                    continue
+                if not CONTINUATION.match(line):
+                    self._split_complete = False
+                if key is not None:
+                    self._blocks[key] += line
+        return self._blocks
+
+def read_front_matter(path, keys=None):
+    """Reads the front matter of a post without reading its body
+
+    Parameters
+    ----------
+    path : string
+        The path of the post.
+    keys : iterable
+        Optional keys to read. Only these keys are parsed.
+
+    Returns
+    -------
+    dict: the front matter, or just the requested keys that are present.
+
+    """
+    post = LazyPost(path)
+    if keys is None:
+        return post.metadata
+    return post.select(keys)
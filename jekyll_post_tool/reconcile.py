@@ -0,0 +1,93 @@
+import os
+
+# Actions in a reconcile plan
+ACTION_CREATE = "create"
+ACTION_UPDATE = "update"
+ACTION_RENAME = "rename"
+ACTION_DELETE = "delete"
+
+def plan_posts(desired, manifest, prune=True):
+    """Diffs the posts that should exist against the posts in a directory
+
+    Parameters
+    ----------
+    desired : dict
+        session_id -> (front_matter, content, file_name) for every post that should exist, or
+        a record for apply_plan's builder whose last item is the file_name.
+    manifest : PostManifest
+        A refreshed manifest of the output directory, keyed by session_id.
+    prune : boolean
+        Delete posts whose session_id is not in desired. Pass False when desired only holds
+        the sessions that changed.
+
+    Returns
+    -------
+    list: (action, session_id, post, existing_path) tuples where post is the desired
+        (front_matter, content, file_name) or None and existing_path is the post on disk or None.
+
+    """
+    existing = manifest.paths_by_key()
+    plan = []
+    for session_id, post in desired.items():
+        paths = existing.get(session_id, [])
+        if not paths:
+            plan.append((ACTION_CREATE, session_id, post, None))
+            continue
+        # Keep the post that already has the right name, otherwise rename the first one
+        keep = next((path for path in paths if os.path.basename(path) == post[-1]), paths[0])
+        if os.path.basename(keep) == post[-1]:
+            plan.append((ACTION_UPDATE, session_id, post, keep))
+        else:
+            plan.append((ACTION_RENAME, session_id, post, keep))
+        # Any other posts for the session are duplicates
+        for path in paths:
+            if path != keep:
+                plan.append((ACTION_DELETE, session_id, None, path))
+    if prune:
+        for session_id in existing.keys() - desired.keys():
+            for path in existing[session_id]:
+                plan.append((ACTION_DELETE, session_id, None, path))
+    return plan
+
+def apply_plan(plan, post_tool, dry_run=False, builder=None):
+    """Applies a reconcile plan, writing every post in one batch
+
+    Parameters
+    ----------
+    plan : list
+        A plan from plan_posts.
+    post_tool : JekyllPostTool
+        The post tool writing to the directory the plan was made for.
+    dry_run : boolean
+        Report every action to post_tool.metrics instead of applying the plan.
+    builder : callable
+        Optional write_posts builder turning the records in the plan into posts, so they
+        are built in the render processes when there are any.
+
+    Returns
+    -------
+    dict: {"actions": {action: count}, "plan": plan, "written": write_posts result or None}
+
+    """
+    actions = {ACTION_CREATE: 0, ACTION_UPDATE: 0, ACTION_RENAME: 0, ACTION_DELETE: 0}
+    for action, session_id, post, existing_path in plan:
+        actions[action] += 1
+    if dry_run:
+        for action, session_id, post, existing_path in plan:
+            file_name = post[-1] if post else None
+            post_tool.metrics.event("{0} {1}: {2}".format(action, session_id, " -> ".join(
+                path for path in (existing_path, file_name) if path)),
+                action=action, session_id=session_id, path=existing_path, file_name=file_name)
+        return {"actions": actions, "plan": plan, "written": None}
+    posts = [post for action, session_id, post, existing_path in plan if post is not None]
+    written = post_tool.write_posts(posts, builder=builder)
+    # Results are in input order, so a post whose builder failed is still matched to its file
+    failed = set(post[-1] for post, result in zip(posts, written["results"]) if result["error"])
+    # Remove renamed and deleted posts once the new posts are in place
+    for action, session_id, post, existing_path in plan:
+        if action == ACTION_RENAME and post[-1] in failed:
+            continue
+        if action in (ACTION_RENAME, ACTION_DELETE):
+            post_tool.remove_post(os.path.relpath(existing_path, post_tool.output_path))
+    post_tool.save_hashes()
+    return {"actions": actions, "plan": plan, "written": written}
@@ -0,0 +1,44 @@
+import yaml
+
+# Use the libyaml backed dumper when PyYAML was built against libyaml
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeDumper
+
+class YAMLSerializer:
+
+    """
+    This class serializes front matter and content into the text of a Jekyll post.
+
+    The output is identical to frontmatter.dumps but skips building a frontmatter.Post
+    and re-resolving the handler and dump options for every post.
+    """
+
+    def __init__(self, dumper=None):
+
+        self.dumper = dumper or SafeDumper
+        # Dump options are resolved once and reused for every post
+        self._dump_options = {
+            "Dumper": self.dumper,
+            "default_flow_style": False,
+            "allow_unicode": True,
+        }
+
+    def serialize(self, front_matter, content):
+        """Serializes a post
+
+        Parameters
+        ----------
+        front_matter : dict/json
+            A dict/json object containing the values to be used in the front matter of the post.
+        content : text
+            The text content of the post.
+
+        Returns
+        -------
+        string: the post text, front matter between --- delimiters followed by the content.
+
+        """
+        metadata = yaml.dump(front_matter, **self._dump_options).strip()
+        return "---\n{0}\n---\n\n{1}".format(metadata, content).strip()
@@ -0,0 +1,131 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+
+# Bump when the schema changes, older caches are rebuilt from their sources
+SOURCE_CACHE_VERSION = 1
+
+class SourceCache:
+
+    """
+    This class caches records parsed from source files such as CSV exports in SQLite.
+
+    Each named source is stored with the path, size, mtime and content hash of the file it
+    was parsed from, so a cache is only used while its source is unchanged. Records are
+    stored as JSON rows indexed by a key field (e.g. session_id or email) and can be looked
+    up individually or streamed without loading the whole cache.
+    """
+
+    def __init__(self, path="source-cache.sqlite3"):
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != SOURCE_CACHE_VERSION:
+            self._connection.executescript("""
+                DROP TABLE IF EXISTS sources;
+                DROP TABLE IF EXISTS records;
+            """)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS sources (
+                name TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS records (
+                source TEXT NOT NULL,
+                key TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (source, key, position)
+            );
+            PRAGMA user_version = {0};
+        """.format(SOURCE_CACHE_VERSION))
+
+    def is_fresh(self, name, path):
+        """Returns True if the cached records for name were built from the file at path as it is now"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT path, size, mtime_ns, hash FROM sources WHERE name = ?", (name,)).fetchone()
+        if row is None or row[0] != os.path.abspath(path):
+            return False
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        if (stat.st_size, stat.st_mtime_ns) == (row[1], row[2]):
+            return True
+        # The file was touched, it is still fresh if its content is the same
+        if stat.st_size != row[1] or file_hash(path) != row[3]:
+            return False
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE sources SET mtime_ns = ? WHERE name = ?", (stat.st_mtime_ns, name))
+        return True
+
+    def store(self, name, path, records, key):
+        """Replaces the cached records for name
+
+        Parameters
+        ----------
+        name : string
+            The name of the source e.g. "sessions".
+        path : string
+            The file the records were parsed from.
+        records : iterable
+            The records as dicts.
+        key : string
+            The field of each record to index the records by.
+
+        """
+        stat = os.stat(path)
+        source = (name, os.path.abspath(path), stat.st_size, stat.st_mtime_ns, file_hash(path))
+        positions = {}
+        rows = []
+        for record in records:
+            record_key = str(record[key])
+            positions[record_key] = positions.get(record_key, -1) + 1
+            rows.append((name, record_key, positions[record_key], json.dumps(record)))
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM records WHERE source = ?", (name,))
+            self._connection.executemany("INSERT INTO records VALUES (?, ?, ?, ?)", rows)
+            self._connection.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)", source)
+        return len(rows)
+
+    def get(self, name, key):
+        """Returns the list of records for name whose key matches"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT data FROM records WHERE source = ? AND key = ? ORDER BY position",
+                (name, str(key))).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def iter_records(self, name, batch_size=1000):
+        """Yields every record for name in the order they were stored, a batch at a time"""
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT data FROM records WHERE source = ? ORDER BY rowid", (name,))
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield json.loads(row[0])
+
+    def close(self):
+        """Closes the SQLite connection"""
+        self._connection.close()
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """Returns the sha256 hex digest of a file, reading it in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as source_file:
+        for chunk in iter(lambda: source_file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
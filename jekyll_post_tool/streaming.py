@@ -0,0 +1,98 @@
+import json
+import codecs
+
+# Characters skipped between the elements of an array
+_WHITESPACE = " \t\n\r"
+
+def iter_json_array(chunks, decoder=None):
+    """Yields the elements of a JSON array one at a time from chunks of its text
+
+    Only the element being decoded and the unread part of the current chunk are held in
+    memory, so records can be processed while a large response is still downloading.
+
+    Parameters
+    ----------
+    chunks : iterable
+        The text of a JSON array as bytes (decoded as utf-8) or str chunks, such as
+        resp.iter_content().
+
+    Returns
+    -------
+    generator: the decoded elements, in order.
+
+    """
+    decoder = decoder or json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+    finished = False
+
+    def read():
+        """Appends the next chunk to the buffer, returning False at the end of the input"""
+        nonlocal buffer, position, finished
+        for chunk in chunks:
+            if isinstance(chunk, bytes):
+                chunk = utf8.decode(chunk)
+            if chunk:
+                # Drop what has already been decoded so the buffer stays small
+                buffer = buffer[position:] + chunk
+                position = 0
+                return True
+        finished = True
+        buffer = buffer[position:] + utf8.decode(b"", final=True)
+        position = 0
+        return False
+
+    def skip(characters):
+        """Moves past whitespace and the given characters, reading more if needed"""
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in characters:
+                position += 1
+            if position < len(buffer) or not read():
+                return
+
+    skip(_WHITESPACE + "\ufeff")
+    if position >= len(buffer) or buffer[position] != "[":
+        raise ValueError("Expected a JSON array")
+    position += 1
+    skip(_WHITESPACE)
+    empty = position < len(buffer) and buffer[position] == "]"
+    while not empty:
+        if position >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        if buffer[position] in ",]":
+            # e.g. [1,,2] or [1,]
+            raise ValueError("Expected a value in the JSON array")
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if finished:
+                    raise
+                read()
+                continue
+            # An element must be followed by , or ], otherwise a number cut off by the end of
+            # a chunk (e.g. 0. of 0.25) may have been decoded, so decode it again with more text
+            following = end
+            while following < len(buffer) and buffer[following] in _WHITESPACE:
+                following += 1
+            if following < len(buffer) and buffer[following] in ",]":
+                break
+            if finished:
+                raise ValueError("Expected , or ] after an array element")
+            read()
+        position = end
+        yield element
+        # Elements are separated by exactly one comma, the array ends with ]
+        skip(_WHITESPACE)
+        if buffer[position] == "]":
+            break
+        position += 1
+        skip(_WHITESPACE)
+    position += 1
+    # Only whitespace may follow the array
+    skip(_WHITESPACE)
+    if position < len(buffer):
+        raise ValueError("Extra data after JSON array")
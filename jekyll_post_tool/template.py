@@ -0,0 +1,75 @@
+import os
+import threading
+
+class PostTemplate:
+
+    """
+    This class holds a post template: default front matter and content for new posts.
+
+    Templates are parsed once and cached by path and mtime, so loading the same template for
+    every post only costs a stat. new_post() hands out independent copies of the defaults.
+    """
+
+    # Absolute path -> (mtime_ns, PostTemplate)
+    _cache = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, metadata=None, content=""):
+
+        if metadata is None:
+            metadata = {}
+        if not isinstance(metadata, dict):
+            raise ValueError("Template front matter must be a mapping, not {0}".format(
+                type(metadata).__name__))
+        self.metadata = metadata
+        self.content = content
+
+    @classmethod
+    def load(cls, path):
+        """Loads a template from a markdown file, reusing the parsed copy while the file is unchanged
+
+        Parameters
+        ----------
+        path : string
+            The path of the template e.g template.md
+
+        Returns
+        -------
+        PostTemplate: the parsed template.
+
+        """
+        path = os.path.abspath(path)
+        mtime = os.stat(path).st_mtime_ns
+        cached = cls._cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        # frontmatter is only imported by callers that use templates
+        import frontmatter
+        with open(path, "r", encoding="utf-8") as template_file:
+            post = frontmatter.loads(template_file.read())
+        template = cls(post.metadata, post.content)
+        with cls._cache_lock:
+            cls._cache[path] = (mtime, template)
+        return template
+
+    def new_post(self, front_matter=None):
+        """Returns a (front_matter, content) copy of the template
+
+        Parameters
+        ----------
+        front_matter : dict/json
+            Optional front matter to merge over the template defaults.
+
+        """
+        metadata = _copy(self.metadata)
+        if front_matter:
+            metadata.update(front_matter)
+        return metadata, self.content
+
+def _copy(value):
+    """Copies the dicts and lists of parsed YAML, sharing the immutable scalars"""
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
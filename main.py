@@ -1,15 +1,90 @@
-from urllib import request
 import io
 import textwrap
 import csv
 import os
-from urllib.parse import urlparse
-import frontmatter
 from io import BytesIO
 import datetime
 import re   
-import pickle
-import glob
+import time
+
+from jekyll_post_tool import (JekyllPostTool, PostManifest, ImageDownloader, SourceCache, PostTemplate,
+                              LazyPost, YAMLSerializer, atomic_write, Metrics, PrintSink)
+
+# Header names accepted for each field of the Pathable exports, matched case insensitively
+SESSION_COLUMNS = {
+    "session_id": ("session id", "session_id", "external id", "code"),
+    "title": ("title", "name"),
+    "blurb": ("description", "blurb", "abstract"),
+    "tracks": ("tracks", "track"),
+    "speakers": ("speakers", "speaker emails", "speaker"),
+}
+USER_COLUMNS = {
+    "speaker_email": ("email", "email address", "speaker_email"),
+    "first_name": ("first name", "first_name"),
+    "second_name": ("last name", "last_name", "second name"),
+    "job-title": ("title", "job title", "job-title"),
+    "company": ("company", "organization", "organisation"),
+    "bio": ("bio", "biography"),
+    "photo_url": ("photo url", "photo", "photo_url", "image url"),
+}
+
+# Default front matter and content of new posts
+TEMPLATE_FILE = "template.md"
+
+def speaker_front_matter(attendee):
+    """Builds the speakers front matter entry for a row of the attendees export"""
+    return {
+        "name": attendee["first_name"] + " " + attendee["second_name"],
+        "biography": attendee["bio"],
+        "job-title": attendee["job-title"],
+        "company": attendee["company"],
+        "speaker-image": attendee["image-name"]
+    }
+
+def build_event_post(record):
+    """Builds a new post from a (session, speakers, date) record
+
+    speakers holds the attendees export rows of the session's speakers. This is the
+    write_posts builder, so with render processes the posts are built in the workers and
+    only the csv records are sent to them.
+    """
+    session, speakers, current_date = record
+    # Copy the default template blog post.
+    new_post, content = PostTemplate.load(TEMPLATE_FILE).new_post()
+
+    # Add speakers for the session
+    names = [speaker_front_matter(attendee) for attendee in speakers]
+    if len(names) > 0:
+        new_post["speakers"] = names
+    else:
+        new_post["speakers"] = "None"
+
+    #Presentations and videos
+    new_post["amazon_s3_presentation_url"] = "None"
+    new_post["amazon_s3_video_url"] = "None"
+    new_post["youtube_video_url"] = "None"
+    new_post["slideshare_presentation_url"] = "None"
+
+    #Jekyll specific front matter
+    new_post["comments"] = False
+    new_post["layout"] = "resource-post"
+    new_post["categories"] = ["yvr18"]
+    new_post["author"] = "connect"
+
+    # Set new values of the blog post.
+    new_post["title"] = re.sub('[^A-Za-z0-9-!: ()]+', '', session["title"])
+    # Add the Jekyll format post date
+    new_post["date"] = current_date + " 09:00:00+00:00"
+    # Add Content to the Jekyll post
+    content = session["blurb"]
+    # Add session tracks
+    new_post["session_track"] = session["tracks"].replace(";",", ")
+    # Add session id
+    new_post["session_id"] = session["session_id"]
+
+    # Create the file name for the new jekyll post
+    new_post_name = "{0}-{1}.md".format(current_date, session["session_id"].lower())
+    return new_post, content, new_post_name
 
 class JekyllConnectSessionsTool:
     
@@ -18,7 +93,8 @@ class JekyllConnectSessionsTool:
     based on export data from Pathable.
     """
 
-    def __init__(self, post_location="not-set", data_src_file_name="sessions.csv", user_src_file_name="users.csv"):
+    def __init__(self, post_location="not-set", data_src_file_name="sessions.csv", user_src_file_name="users.csv",
+                 cache_file_name="exports.sqlite3", render_processes=None, metrics_sink=None):
 
         # Get the data source csv file
         self._data_src_file_name = data_src_file_name
@@ -26,36 +102,44 @@ class JekyllConnectSessionsTool:
         self._user_src_file_name = user_src_file_name
         # Location of posts
         self._post_location = post_location
+        # SQLite cache of the parsed csv files
+        self._cache_file_name = cache_file_name
+        # Worker processes used to render posts, None renders them in the writer threads
+        self._render_processes = render_processes
         # Local Output path for images
         self.output_path = os.getcwd() + "/" + "posts/"
+        # Speaker front matter keyed by email, filled in by build_speakers
+        self._speaker_records = {}
+        # Per stage timings and counters for the run, printed unless another sink is given
+        self.metrics = Metrics(metrics_sink or PrintSink())
 
         self.main()
 
     def main(self):
 
-        # Check to see if there is already a sessions.pkl file created
-        try:
-            sessions = pickle.load(open("sessions.pkl", "rb"))
-        except (OSError, IOError) as e:
-            sessions = self.grab_session_data_from_csv()
-            self.cache_file(sessions, "sessions.pkl")
-
-        # Load the users.pkl file if exists
-        try:
-            users = pickle.load(open("users.pkl", "rb"))
-        except (OSError, IOError) as e:
-            users = self.grab_user_data_from_csv()
+        # Parsed exports are cached until the csv files they came from change
+        cache = SourceCache(self._cache_file_name)
+
+        with self.metrics.timer("fetch"):
+            if cache.is_fresh("sessions", self._data_src_file_name):
+                self.metrics.incr("cache_hits")
+                sessions = self.index_sessions(cache.iter_records("sessions"))
+            else:
+                sessions = self.grab_session_data_from_csv()
+                cache.store("sessions", self._data_src_file_name, sessions.values(), key="session_id")
+
+        if cache.is_fresh("users", self._user_src_file_name):
+            self.metrics.incr("cache_hits")
+            with self.metrics.timer("fetch"):
+                users = self.index_users(cache.iter_records("users"))
+        else:
+            with self.metrics.timer("fetch"):
+                users = self.grab_user_data_from_csv()
             # Download attendee photos from pathable.
-            for user in users:
-                if user["photo_url"]:
-                    username = user["first_name"] + user["second_name"]
-                    photo_download = self.grab_photo(user["photo_url"], output_filename=username)
-                    print(photo_download)
-                    user["image-name"] = photo_download
-                else:
-                    print("No Photo Url for {0} - skipping!").format(username)
-            # Dump the data into cache file
-            self.cache_file(users, "users.pkl")
+            self.grab_photos(users)
+            cache.store("users", self._user_src_file_name,
+                        (user for matches in users.values() for user in matches), key="speaker_email")
+        cache.close()
 
         # Check to see if a post_location is provided.
         # If so modify the current posts with updated front matter
@@ -64,232 +148,170 @@ class JekyllConnectSessionsTool:
             self.create_jekyll_event_posts(sessions, users)
         else:
             self.update_existing_posts(sessions, users)
+        self.metrics.flush()
 
     def create_jekyll_event_posts(self, sessions, users):
-        """Create Jekyll Posts based off the output csv files from pathable."""
-        for session in sessions:
-            # Open a default template blog post.
-            new_post = frontmatter.loads(open("template.md","r").read())
-
-            # Add speakers for the session
-            emails = session["speakers"].split(",")
-            names = []
-            for speaker_email in emails:
-                for attendee in users:
-                    if attendee["speaker_email"] == speaker_email:
-                        name = attendee["first_name"] + " " + attendee["second_name"]
-                        # bio_formatted =  '{0}'.format(attendee["bio"])
-                        # bio_formatted =  repr(attendee["bio"])
-                        # bio_formatted =  f'"{attendee["bio"]}"'
-                        bio_formatted =  attendee["bio"]
-                        speaker_dict = {
-                                "name":name,
-                                "biography": bio_formatted,
-                                "job-title": attendee["job-title"],
-                                "company": attendee["company"],
-                                "speaker-image": attendee["image-name"]
-                                }
-                        names.append(speaker_dict)
-            if len(names) > 0:
-                new_post["speakers"] = names
-            else:
-                new_post["speakers"] = "None"
-
-            #Presentations and videos
-            new_post["amazon_s3_presentation_url"] = "None"
-            new_post["amazon_s3_video_url"] = "None"
-            new_post["youtube_video_url"] = "None"
-            new_post["slideshare_presentation_url"] = "None"
-
-            #Jekyll specific front matter
-            new_post["comments"] = False
-            new_post["layout"] = "resource-post"
-            new_post["categories"] = ["yvr18"]
-            new_post["author"] = "connect"
-            
-            # Set new values of the blog post.
-            new_post["title"] = re.sub('[^A-Za-z0-9-!: ()]+', '', session["title"])
-            print(new_post["title"])
-            # Get Current date
-            current_date = datetime.datetime.now().strftime("%Y-%m-%d")
-            # Add the Jekyll format post date
-            new_post["date"] = current_date + " 09:00:00+00:00"
-            # Add Content to the Jekyll post
-            new_post.content = session["blurb"]
-            # Add session tracks
-            new_post["session_track"] = session["tracks"].replace(";",", ")
-            # Add session id
-            new_post["session_id"] = session["session_id"]
-
-            # Create the file name for the new jekyll post
-            new_post_name = "{0}-{1}.md".format(current_date, session["session_id"].lower())
-            # Prepend the output folder and the new_post_name
-            output_object = "posts/" + new_post_name
-            # Create the new post object and write the front matter to post.
-            with open(output_object,"w") as new_post_file:
-                new_post_file.writelines(frontmatter.dumps(new_post))
-                print("Jekyll post created for {0} at {1}".format(session["session_id"], output_object))
-
-    def get_blog_posts(self, location):
-        """Takes a path and returns list of blog posts"""
-
-        # Types of files to look for in the directory
-        types = [".md",".markdown",".mdown"]
-        
-        if location.endswith("/"):
-            directory_name = location.split("/")[-2]
-        else:
-            directory_name = location.split("/")[-1]
-                
-        # Loop through and find all markdown files
-        markdown_files = []
-        for type in types:
-            for markdown_file in glob.iglob('{0}/**/*{1}'.format(location,type), recursive=True):
-                markdown_files.append(markdown_file)
-        return markdown_files
+        """Create Jekyll Posts based off the output csv files from pathable.
+
+        sessions is keyed by session_id and users by speaker_email, as returned by
+        grab_session_data_from_csv and grab_user_data_from_csv.
+        """
+        post_tool = JekyllPostTool({"output": "posts/", "render_processes": self._render_processes,
+                                    "metrics": self.metrics})
+        # Parse the default template blog post once up front so a missing template fails early
+        PostTemplate.load(TEMPLATE_FILE)
+        written = post_tool.write_posts(self.build_event_posts(sessions, users),
+                                        builder=build_event_post)
+        for result in written["results"]:
+            if result["error"]:
+                self.metrics.incr("write_errors")
+                self.metrics.event("Failed to write {0}: {1}".format(
+                    result["file_name"], result["error"]), path=result["file_name"])
+
+    def build_event_posts(self, sessions, users):
+        """Yields a (session, speakers, date) record for each session for build_event_post"""
+        # Every post of the run gets the same date whatever process builds it
+        current_date = datetime.datetime.now().strftime("%Y-%m-%d")
+        for session in sessions.values():
+            join_started = time.perf_counter()
+            speakers = [attendee for speaker_email in session["speakers"].split(",")
+                        for attendee in users.get(speaker_email, [])]
+            self.metrics.record("join", time.perf_counter() - join_started)
+            yield session, speakers, current_date
+
+    def index_sessions(self, sessions):
+        """Returns the sessions keyed by session_id, later rows replacing earlier ones"""
+        return {session["session_id"]: session for session in sessions}
+
+    def index_users(self, users):
+        """Returns a dict of speaker_email -> list of users"""
+        users_by_email = {}
+        for user in users:
+            users_by_email.setdefault(user["speaker_email"], []).append(user)
+        return users_by_email
+
+    def build_speakers(self, speakers, users_by_email):
+        """Builds the speakers front matter for a comma separated list of speaker emails"""
+        names = []
+        for speaker_email in speakers.split(","):
+            if speaker_email not in self._speaker_records:
+                self._speaker_records[speaker_email] = [
+                    speaker_front_matter(attendee)
+                    for attendee in users_by_email.get(speaker_email, [])
+                ]
+            # Copy the cached records so posts never share mutable front matter
+            names.extend(dict(record) for record in self._speaker_records[speaker_email])
+        return names
 
     def update_existing_posts(self, sessions, users):
         """Take the latest export of sessions and users and update any information that has changed"""
         if self._post_location:
             count = 0
-            blog_posts = self.get_blog_posts(self._post_location)
-            # Loop through all the markdown posts in the directory
-            for post in blog_posts:
-                changed = False
-                front_matter = frontmatter.loads(open(post,"r").read())
-                for session in sessions:
-                    if session['session_id'] == front_matter['session_id']:
-                        # Gather speaker information
-                        emails = session["speakers"].split(",")
-                        names = []
-                        for speaker_email in emails:
-                            for attendee in users:
-                                if attendee["speaker_email"] == speaker_email:
-                                    name = attendee["first_name"] + " " + attendee["second_name"]
-                                    bio_formatted =  f'"{attendee["bio"]}"'
-                                    speaker_dict = {
-                                            "name":name,
-                                            "biography": bio_formatted,
-                                            "job-title": attendee["job-title"],
-                                            "company": attendee["company"],
-                                            "speaker-image": attendee["image-name"]
-                                            }
-                                    names.append(speaker_dict)
-                        # Check if there are changes to speakers
-                        if front_matter['speakers'] != names:
-                            front_matter['speakers'] = names
-                            changed = True
-
-                        # Check if session tracks have changed.
-                        tracks = session["tracks"].replace(";",", ")
-                        if front_matter["session_track"] != tracks:
-                            front_matter["session_track"] = tracks
-                            changed = True
-                        
-                        # Check if title has changed
-                        title = re.sub('[^A-Za-z0-9-!: ()]+', '', session["title"])
-                        if front_matter['title'] != title:
-                            front_matter['title'] = title
-                            changed = True
-                        
-                        # Check if post content has changed
-                        content = session['blurb']
-                        if front_matter.content != content:
-                            front_matter.content = content
-                            changed = True
-                        
-                        if changed:
-                            # Write the changed frontmatter to the file.
-                            with open(post,"w") as changed_file:
-                                changed_file.writelines(frontmatter.dumps(front_matter))
-                                print("{0} post updated!".format(session['session_id']))
-                                count += 1
-            print("{0} posts updated!".format(count))
-                        
+            # Index the existing posts by session id, only re-parsing posts changed since the last run
+            manifest = PostManifest(self._post_location)
+            manifest.refresh()
+            self._speaker_records = {}
+            serializer = YAMLSerializer()
+            posts_by_session = manifest.paths_by_key()
+            # Loop through the sessions and update every post written for each one
+            for session_id, session in sessions.items():
+                for post in posts_by_session.get(session_id, []):
+                    changed = False
+                    join_started = time.perf_counter()
+                    # Only the front matter is read up front, the body is read when it is compared
+                    existing = LazyPost(post)
+                    front_matter = existing.select(["speakers", "session_track", "title"])
+                    # Gather speaker information
+                    names = self.build_speakers(session["speakers"], users)
+                    # Check if there are changes to speakers
+                    if front_matter.get('speakers') != names:
+                        front_matter['speakers'] = names
+                        changed = True
+
+                    # Check if session tracks have changed.
+                    tracks = session["tracks"].replace(";",", ")
+                    if front_matter.get("session_track") != tracks:
+                        front_matter["session_track"] = tracks
+                        changed = True
+
+                    # Check if title has changed
+                    title = re.sub('[^A-Za-z0-9-!: ()]+', '', session["title"])
+                    if front_matter.get('title') != title:
+                        front_matter['title'] = title
+                        changed = True
+
+                    # Check if post content has changed
+                    content = session['blurb']
+                    if existing.content != content:
+                        changed = True
+
+                    self.metrics.record("join", time.perf_counter() - join_started)
+                    if changed:
+                        # Write the changed frontmatter to the file.
+                        with self.metrics.timer("write"):
+                            # The full front matter is only parsed for posts that are rewritten
+                            metadata = dict(existing.metadata, **front_matter)
+                            rendered = serializer.serialize(metadata, content).encode("utf-8")
+                            # Replaced atomically so jekyll never sees a half written post
+                            atomic_write(post, rendered)
+                        self.metrics.incr("bytes_written", len(rendered))
+                        self.metrics.event("{0} post updated!".format(session['session_id']), path=post)
+                        count += 1
+                        manifest.update(post)
+                    else:
+                        self.metrics.incr("files_skipped")
+            manifest.save()
+            self.metrics.incr("posts_updated", count)
+            self.metrics.event("{0} posts updated!".format(count), updated=count)
+
         else:
             return False
-            
+
     def grab_session_data_from_csv(self):
-        """Fetches the session data from the pathable meetings export"""
-        my_file = self._data_src_file_name
-        with open(my_file, 'rt',encoding="utf8") as f:
-            reader = csv.reader(f)
-            csv_data = list(reader)
-            data = []
-            for each in csv_data:
-                title = each[4]
-                desc = each[5]
-                session_id = each[1]
-                speaker_names = each[10]
-                tracks = each[7]
-                new_dict = {
-                    "title":title,
-                    "blurb":desc,
-                    "session_id":session_id,
-                    "speakers":speaker_names,
-                    "tracks": tracks
-                }
-                data.append(new_dict)
-            # for each in data:
-            #     print(each)
-            #     input()
-        return data
-
-    def cache_file(self, data, cache_file_name):
-        """Dumps the data supplied into specificed cache_file_name using pickle"""
-        with open(cache_file_name, 'wb') as output:
-            pickle.dump(data, output, pickle.HIGHEST_PROTOCOL)
-        return True
+        """Fetches the session data from the pathable meetings export, keyed by session_id"""
+        return self.index_sessions(self.read_csv_records(self._data_src_file_name, SESSION_COLUMNS))
 
+    def read_csv_records(self, file_name, columns):
+        """Lazily yields a dict of the fields in columns for each row of a csv export
 
-    def grab_user_data_from_csv(self):
-        """Fetches the user data from the pathable attendees export"""
-        my_file = self._user_src_file_name
-        with open(my_file, 'rt',encoding="utf8") as f:
+        The position of each field is resolved once from the header row, so a reordered
+        export still loads and an export missing a field fails straight away.
+        """
+        with open(file_name, 'rt', encoding="utf8", newline="") as f:
             reader = csv.reader(f)
-            csv_data = list(reader)
-            data = []
-            for each in csv_data:
-                email = each[12]
-                first_name = each[2]
-                second_name = each[3]
-                title = each[4]
-                company = each[6]
-                bio = each[7]
-                photo_url = each[16]
-                new_dict = {
-                    "speaker_email":email,
-                    "first_name":first_name,
-                    "second_name":second_name,
-                    "job-title":title,
-                    "company": company,
-                    "bio": bio,
-                    "photo_url": photo_url
-                }
-                data.append(new_dict)
-            # for each in data:
-            #     print(each)
-            #     input()
-        return data
-                        
-    def grab_photo(self, url, output_filename, output_path="photos/"):
-        """Fetches attendee photo from the pathable data"""
-        # Get the filename parsed in
-        file_name = output_filename
-        # Extract the path from the URL
-        path = urlparse(url).path
-        # Get the Extension from the path using os.path.splitext
-        ext = os.path.splitext(path)[1]
-        # Add output folder to output path
-        output =  output_path + file_name + ext
-        # Try to download the image and Except errors and return as false.
-        try:
-            image = request.urlretrieve(url, output)
-            print(image)
-        except Exception as e:
-            print(e)
-            image = False
-        return(file_name + ext)
+            header = [name.strip().lower() for name in next(reader, [])]
+            positions = {}
+            for field, names in columns.items():
+                for name in names:
+                    if name in header:
+                        positions[field] = header.index(name)
+                        break
+            missing = [field for field in columns if field not in positions]
+            if missing:
+                raise ValueError("{0} is missing columns for {1} (header: {2})".format(
+                    file_name, ", ".join(missing), header))
+            fields = list(positions.items())
+            for row in reader:
+                if not row:
+                    continue
+                yield {field: row[position] if position < len(row) else ""
+                       for field, position in fields}
+
+    def grab_user_data_from_csv(self):
+        """Fetches the user data from the pathable attendees export, keyed by speaker_email"""
+        return self.index_users(self.read_csv_records(self._user_src_file_name, USER_COLUMNS))
+
+    def grab_photos(self, users, output_path="photos/"):
+        """Fetches the attendee photos for the users keyed by speaker_email in parallel"""
+        users = [user for matches in users.values() for user in matches]
+        downloader = ImageDownloader(output_path, metrics=self.metrics)
+        photos = downloader.download_many(user["photo_url"] for user in users if user["photo_url"])
+        for user in users:
+            user["image-name"] = photos.get(user["photo_url"])
+            if not user["photo_url"]:
+                self.metrics.event("No Photo Url for {0} - skipping!".format(
+                    user["first_name"] + user["second_name"]), email=user["speaker_email"])
+        return users
         
 if __name__ == "__main__":
     
@@ -24,5 +24,8 @@ setup(
     author_email='kyle.kirkby@linaro.org',
     url='https://github.com/linaro-marketing/JekyllPostTool',
     license=license,
-    packages=find_packages(exclude=('tests', 'docs'))
+    packages=find_packages(exclude=('tests', 'docs', 'benchmarks', 'benchmarks.*', 'examples', 'examples.*')),
+    entry_points={
+        'console_scripts': ['jekyll-post-tool=jekyll_post_tool.cli:main'],
+    }
 )
@@ -0,0 +1,19 @@
+"""
+pytest fixtures shared by the tests that run against the sched.com stub.
+"""
+import pytest
+
+from benchmarks.generator import SyntheticEvent
+from benchmarks.stub_server import SchedStubServer
+
+
+@pytest.fixture
+def event():
+    return SyntheticEvent(sessions=20, users=40)
+
+
+@pytest.fixture
+def stub(event):
+    stub = SchedStubServer(event).start()
+    yield stub
+    stub.stop()
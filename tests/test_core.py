@@ -0,0 +1,112 @@
+"""
+Tests for JekyllPostTool.write_post and atomic_write.
+"""
+import json
+import os
+
+import pytest
+
+from jekyll_post_tool import (POST_CREATED, POST_UPDATED, POST_UNCHANGED, JekyllPostTool,
+                              MemoryStorage, atomic_write)
+
+
+FRONT_MATTER = {"title": "Title", "session_id": "A"}
+
+
+def test_write_post_reports_created_updated_and_unchanged(tmp_path):
+    post_tool = JekyllPostTool({"output": str(tmp_path) + "/"})
+    assert post_tool.write_post(FRONT_MATTER, "Content", "a.md") == POST_CREATED
+    mtime_ns = os.stat(str(tmp_path / "a.md")).st_mtime_ns
+    assert post_tool.write_post(FRONT_MATTER, "Content", "a.md") == POST_UNCHANGED
+    # An unchanged post is not rewritten
+    assert os.stat(str(tmp_path / "a.md")).st_mtime_ns == mtime_ns
+    assert post_tool.write_post(FRONT_MATTER, "New content", "a.md") == POST_UPDATED
+    with open(str(tmp_path / "a.md")) as post_file:
+        assert post_file.read().endswith("New content")
+
+
+def test_write_post_to_memory_storage():
+    storage = MemoryStorage()
+    post_tool = JekyllPostTool({"storage": storage})
+    assert post_tool.write_post(FRONT_MATTER, "Content", "a.md") == POST_CREATED
+    assert post_tool.write_post(FRONT_MATTER, "Content", "a.md") == POST_UNCHANGED
+    assert storage.read("a.md").startswith(b"---\n")
+
+
+def test_hash_sidecar_records_posts_and_skips_reading_them(tmp_path):
+    output = tmp_path / "output"
+    output.mkdir()
+    hash_file = str(tmp_path / "hashes.json")
+    post_tool = JekyllPostTool({"output": str(output) + "/", "hash_file": hash_file})
+    post_tool.write_post(FRONT_MATTER, "Content", "a.md")
+    assert post_tool.save_hashes()
+    with open(hash_file) as sidecar:
+        hashes = json.load(sidecar)
+    stat = os.stat(str(output / "a.md"))
+    assert hashes["a.md"][:2] == [stat.st_size, stat.st_mtime_ns]
+    # A new tool trusts the sidecar instead of reading the post back
+    post_tool = JekyllPostTool({"output": str(output) + "/", "hash_file": hash_file})
+    post_tool.storage.read = None
+    assert post_tool.write_post(FRONT_MATTER, "Content", "a.md") == POST_UNCHANGED
+
+
+def test_hash_sidecar_ignores_posts_changed_on_disk(tmp_path):
+    output = tmp_path / "output"
+    output.mkdir()
+    hash_file = str(tmp_path / "hashes.json")
+    post_tool = JekyllPostTool({"output": str(output) + "/", "hash_file": hash_file})
+    post_tool.write_post(FRONT_MATTER, "Content", "a.md")
+    post_tool.save_hashes()
+    with open(str(output / "a.md"), "a") as post_file:
+        post_file.write(" edited")
+    post_tool = JekyllPostTool({"output": str(output) + "/", "hash_file": hash_file})
+    assert post_tool.write_post(FRONT_MATTER, "Content", "a.md") == POST_UPDATED
+    # Removed posts are dropped from the sidecar
+    post_tool.remove_post("a.md")
+    post_tool.save_hashes()
+    with open(hash_file) as sidecar:
+        assert json.load(sidecar) == {}
+
+
+def test_atomic_write_replaces_the_file_and_leaves_no_temp_files(tmp_path):
+    path = str(tmp_path / "a.md")
+    atomic_write(path, b"old")
+    atomic_write(path, b"new", durable=True)
+    with open(path, "rb") as post_file:
+        assert post_file.read() == b"new"
+    assert os.listdir(str(tmp_path)) == ["a.md"]
+
+
+def test_atomic_write_keeps_the_old_file_when_writing_fails(tmp_path):
+    path = str(tmp_path / "a.md")
+    atomic_write(path, b"old")
+    # Writing a str to the binary temp file fails after it has been created
+    with pytest.raises(TypeError):
+        atomic_write(path, "new")
+    with open(path, "rb") as post_file:
+        assert post_file.read() == b"old"
+    assert os.listdir(str(tmp_path)) == ["a.md"]
+
+
+def test_temp_files_get_the_umask_permissions(tmp_path):
+    old_umask = os.umask(0o027)
+    try:
+        atomic_write(str(tmp_path / "a.md"), b"post")
+    finally:
+        os.umask(old_umask)
+    assert os.stat(str(tmp_path / "a.md")).st_mode & 0o777 == 0o640
+
+
+def test_write_posts_with_durable_writes(tmp_path):
+    post_tool = JekyllPostTool({"output": str(tmp_path) + "/", "durable": True})
+    posts = [({"title": str(index)}, "Content", "{}.md".format(index)) for index in range(10)]
+    written = post_tool.write_posts(posts, max_workers=4)
+    assert written["counts"][POST_CREATED] == 10
+    assert sorted(os.listdir(str(tmp_path))) == sorted(post[2] for post in posts)
+
+
+def test_posts_in_subdirectories_are_written(tmp_path):
+    post_tool = JekyllPostTool({"output": str(tmp_path) + "/"})
+    assert post_tool.write_post(FRONT_MATTER, "Content", "2020/a.md") == POST_CREATED
+    assert post_tool.write_post(FRONT_MATTER, "Content", "2020/a.md") == POST_UNCHANGED
+    assert os.listdir(str(tmp_path / "2020")) == ["a.md"]
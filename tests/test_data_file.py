@@ -0,0 +1,55 @@
+"""
+Tests for DataFile's incremental updates.
+"""
+import json
+import os
+
+from jekyll_post_tool import DataFile
+
+
+def test_unchanged_entries_keep_their_lines_byte_for_byte(tmp_path):
+    path = str(tmp_path / "resources.json")
+    # Lines written by hand, in a different key order and spacing than json.dumps uses
+    with open(path, "w", encoding="utf-8") as data_file:
+        data_file.write('[\n'
+                        '  {"title": "Café",   "session_id": "A-1"},\n'
+                        '  {"title": "Old", "session_id": "B-1"}\n'
+                        ']\n')
+    changes = DataFile(path).update([{"session_id": "A-1", "title": "Café"},
+                                     {"session_id": "B-1", "title": "New"}])
+    assert changes == {"added": [], "updated": ["B-1"], "removed": []}
+    with open(path, "rb") as data_file:
+        lines = data_file.read().split(b"\n")
+    assert lines[1] == '  {"title": "Café",   "session_id": "A-1"},'.encode("utf-8")
+    assert json.loads(lines[2]) == {"session_id": "B-1", "title": "New"}
+
+
+def test_the_file_is_only_rewritten_when_entries_change(tmp_path):
+    path = str(tmp_path / "resources.json")
+    data_file = DataFile(path)
+    entries = [{"session_id": "B-1", "title": "B"}, {"session_id": "A-1", "title": "A"}]
+    assert data_file.update(entries)["added"] == ["B-1", "A-1"]
+    with open(path, "rb") as written:
+        first = written.read()
+    mtime_ns = os.stat(path).st_mtime_ns
+    assert data_file.update(reversed(entries)) == {"added": [], "updated": [], "removed": []}
+    assert os.stat(path).st_mtime_ns == mtime_ns
+    # Entries are sorted by key and the file is still one JSON array
+    assert [entry["session_id"] for entry in json.loads(first.decode("utf-8"))] == ["A-1", "B-1"]
+
+
+def test_prune_removes_missing_entries(tmp_path):
+    path = str(tmp_path / "resources.json")
+    data_file = DataFile(path)
+    data_file.update([{"session_id": "A-1"}, {"session_id": "B-1"}])
+    assert data_file.update([{"session_id": "A-1"}])["removed"] == []
+    assert data_file.update([{"session_id": "A-1"}], prune=True)["removed"] == ["B-1"]
+    assert data_file.update([], dry_run=True, prune=True)["removed"] == ["A-1"]
+    assert list(data_file.load()) == ["A-1"]
+
+
+def test_a_pretty_printed_file_is_read_as_a_whole(tmp_path):
+    path = str(tmp_path / "resources.json")
+    with open(path, "w", encoding="utf-8") as data_file:
+        json.dump([{"session_id": "A-1", "title": "A"}], data_file, indent=4)
+    assert DataFile(path).update([{"session_id": "A-1", "title": "A"}])["updated"] == []
@@ -0,0 +1,82 @@
+"""
+Tests for ResponseCache revalidation, against the sched.com stub.
+"""
+import os
+
+import pytest
+import requests
+
+from jekyll_post_tool import ResponseCache, OfflineCacheMiss
+
+
+@pytest.fixture
+def session():
+    session = requests.Session()
+    yield session
+    session.close()
+
+
+def test_fresh_entries_are_served_from_the_cache(tmp_path, stub, session, event):
+    cache = ResponseCache(str(tmp_path), ttl=300)
+    url = stub.url + "/api/user/list?api_key=secret"
+    assert len(cache.fetch(session, url)) == len(event.users)
+    assert len(cache.fetch(session, url)) == len(event.users)
+    assert stub.requests["/api/user/list"] == 1
+    assert (cache.hits, cache.misses, cache.revalidated) == (1, 1, 0)
+    # The API key is never written to disk
+    for file_name in os.listdir(str(tmp_path)):
+        with open(os.path.join(str(tmp_path), file_name), "rb") as cache_file:
+            assert b"secret" not in cache_file.read()
+
+
+def test_stale_entries_are_revalidated_with_the_etag(tmp_path, stub, session, event):
+    cache = ResponseCache(str(tmp_path), ttl=0)
+    url = stub.url + "/api/user/list"
+    first = cache.fetch(session, url)
+    assert cache.fetch(session, url) == first
+    assert stub.requests["/api/user/list"] == 2
+    assert (cache.hits, cache.misses, cache.revalidated) == (0, 1, 1)
+    # A changed response replaces the cached one
+    event.users[0]["company"] = "Changed"
+    assert cache.fetch(session, url)[0]["company"] == "Changed"
+    assert cache.misses == 2
+
+
+def test_refresh_revalidates_fresh_entries(tmp_path, stub, session):
+    cache = ResponseCache(str(tmp_path), ttl=300)
+    url = stub.url + "/api/user/list"
+    cache.fetch(session, url)
+    cache.fetch(session, url, refresh=True)
+    assert stub.requests["/api/user/list"] == 2
+    assert cache.revalidated == 1
+
+
+def test_streamed_records_are_cached_and_revalidated(tmp_path, stub, session, event):
+    cache = ResponseCache(str(tmp_path), ttl=0)
+    url = stub.url + "/api/session/list?since=0"
+    first = list(cache.fetch_records(session, url, chunk_size=512))
+    assert [session["id"] for session in first] == [session["id"] for session in event.sessions]
+    assert list(cache.fetch_records(session, url, chunk_size=512)) == first
+    assert (cache.misses, cache.revalidated) == (1, 1)
+    assert any(file_name.endswith(".body") for file_name in os.listdir(str(tmp_path)))
+
+
+def test_partly_read_streams_are_not_cached(tmp_path, stub, session):
+    cache = ResponseCache(str(tmp_path), ttl=300)
+    url = stub.url + "/api/session/list?since=0"
+    records = cache.fetch_records(session, url, chunk_size=512)
+    next(records)
+    records.close()
+    assert os.listdir(str(tmp_path)) == []
+    list(cache.fetch_records(session, url))
+    assert stub.requests["/api/session/list"] == 2
+
+
+def test_offline_serves_only_the_cache(tmp_path, stub, session):
+    url = stub.url + "/api/user/list"
+    ResponseCache(str(tmp_path)).fetch(session, url)
+    offline = ResponseCache(str(tmp_path), ttl=0, offline=True)
+    offline.fetch(session, url)
+    with pytest.raises(OfflineCacheMiss):
+        offline.fetch(session, stub.url + "/api/session/list")
+    assert stub.requests["/api/user/list"] == 1
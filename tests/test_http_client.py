@@ -0,0 +1,96 @@
+"""
+Tests for the token bucket and the rate limited session, against the sched.com stub.
+"""
+import time
+import threading
+from concurrent import futures
+
+from jekyll_post_tool import (TokenBucket, RateLimitedSession, Metrics, PRIORITY_BULK,
+                              PRIORITY_LOOKUP)
+from benchmarks.stub_server import SchedStubServer
+
+
+def test_bucket_allows_a_burst_then_the_rate():
+    bucket = TokenBucket(rate=50, burst=5)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.05
+    for _ in range(10):
+        bucket.acquire()
+    # The 10 tokens after the burst take at least 10 / 50 seconds to earn
+    assert time.monotonic() - started >= 0.18
+
+
+def test_waiting_callers_are_served_in_priority_order():
+    bucket = TokenBucket(rate=20, burst=1)
+    bucket.acquire()
+    order = []
+
+    def acquire(name, priority):
+        bucket.acquire(priority)
+        order.append(name)
+
+    threads = []
+    for name, priority in [("lookup 1", PRIORITY_LOOKUP), ("lookup 2", PRIORITY_LOOKUP),
+                           ("bulk", PRIORITY_BULK)]:
+        thread = threading.Thread(target=acquire, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        # Queue the callers in this order
+        time.sleep(0.005)
+    for thread in threads:
+        thread.join()
+    assert order == ["bulk", "lookup 1", "lookup 2"]
+
+
+def test_throttling_halves_the_rate_and_success_recovers_it():
+    bucket = TokenBucket(rate=10, min_rate=1)
+    bucket.throttled()
+    assert bucket.rate == 5
+    for _ in range(3):
+        bucket.throttled()
+    assert bucket.rate == 1
+    for _ in range(100):
+        bucket.succeeded()
+    assert bucket.rate == 10
+
+
+def test_retry_after_pauses_the_bucket():
+    bucket = TokenBucket(rate=1000, burst=10)
+    bucket.throttled(retry_after=0.2)
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.19
+
+
+def test_throttled_requests_are_retried(event):
+    stub = SchedStubServer(event, rate_limit=3, retry_after=1).start()
+    metrics = Metrics()
+    client = RateLimitedSession(rate=100, backoff=0.05, metrics=metrics)
+    try:
+        url = stub.url + "/api/user/list"
+        with futures.ThreadPoolExecutor(max_workers=6) as executor:
+            responses = list(executor.map(lambda _: client.get(url), range(6)))
+    finally:
+        client.close()
+        stub.stop()
+    assert [resp.status_code for resp in responses] == [200] * 6
+    assert stub.requests["throttled"] >= 3
+    assert metrics.counters["requests_throttled"] == stub.requests["throttled"]
+    assert client.bucket.rate < 100
+
+
+def test_retry_after_header_is_parsed():
+    client = RateLimitedSession()
+
+    class Response:
+        def __init__(self, value):
+            self.headers = {"Retry-After": value} if value is not None else {}
+
+    assert client._retry_after(Response("3")) == 3
+    assert client._retry_after(Response(None)) is None
+    assert client._retry_after(Response("soon")) is None
+    # An HTTP date in the past means no wait
+    assert client._retry_after(Response("Wed, 21 Oct 2015 07:28:00 GMT")) == 0
+    client.close()
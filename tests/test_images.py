@@ -0,0 +1,35 @@
+"""
+Tests for ImageDownloader, against the sched.com stub.
+"""
+import os
+
+import requests
+
+from jekyll_post_tool import ImageDownloader
+
+
+def test_a_shared_session_keeps_its_pool_and_user_agent(tmp_path):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=24)
+    session.mount("http://", adapter)
+    user_agent = session.headers["User-Agent"]
+    ImageDownloader(str(tmp_path), session=session, max_workers=4)
+    assert session.get_adapter("http://example.com/") is adapter
+    assert session.headers["User-Agent"] == user_agent
+    session.close()
+
+
+def test_images_are_stored_once_and_revalidated(tmp_path, stub, event):
+    avatars = [stub.url + user["avatar"] for user in event.users if user["avatar"]]
+    downloader = ImageDownloader(str(tmp_path), max_workers=4)
+    images = downloader.download_many(avatars)
+    assert set(images) == set(avatars)
+    # Every avatar the stub serves has different content
+    assert len(set(images.values())) == len(set(avatars))
+    assert downloader.save()
+    # A second run only makes conditional requests
+    downloader = ImageDownloader(str(tmp_path), max_workers=4)
+    assert downloader.download_many(avatars) == images
+    assert downloader.metrics.counters["images_not_modified"] == len(set(avatars))
+    for file_name in set(images.values()):
+        assert os.path.exists(str(tmp_path / file_name))
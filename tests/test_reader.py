@@ -0,0 +1,56 @@
+"""
+Tests for LazyPost's partial front matter parsing.
+"""
+import pytest
+
+from jekyll_post_tool import LazyPost, read_front_matter
+
+
+def make_post(tmp_path, header, body="Body\n"):
+    path = tmp_path / "post.md"
+    path.write_text("---\n" + header + "---\n" + body, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("header", [
+    # Block style keys with nested values, sequences and comments
+    "title: A post\nsession_speakers:\n- name: A\n  bio: b\n# comment\nsession_id: X-1\n",
+    # Quoted keys
+    "'title': a\n\"session_id\": X-1\n",
+    # Keys the splitter can't match are found by parsing everything
+    "a:b: c\nsession_id: X-1\n",
+    "-k: v\nsession_id: X-1\n",
+    # Flow style front matter
+    "{title: a,\n session_id: X-1}\n",
+    # Anchors, merge keys and keys that are not strings
+    "base: &base\n  session_id: X-1\n<<: *base\n",
+    "1: one\ntrue: yes\nsession_id: X-1\n",
+])
+def test_get_matches_the_parsed_front_matter(tmp_path, header):
+    path = make_post(tmp_path, header)
+    assert LazyPost(path).get("session_id") == "X-1"
+    assert LazyPost(path).get("missing", "default") == "default"
+    assert read_front_matter(path, ["session_id"]) == {"session_id": "X-1"}
+
+
+def test_only_the_requested_key_is_parsed(tmp_path):
+    path = make_post(tmp_path, "title: [unclosed\nsession_id: X-1\n")
+    post = LazyPost(path)
+    assert post.get("session_id") == "X-1"
+    assert post._metadata is None
+
+
+def test_content_is_read_on_demand(tmp_path):
+    path = make_post(tmp_path, "title: a\n", body="\nThe body\n")
+    post = LazyPost(path)
+    assert post._content is None
+    assert post.content == "The body"
+    assert post["title"] == "a"
+
+
+def test_posts_without_front_matter(tmp_path):
+    path = tmp_path / "post.md"
+    path.write_text("No front matter\n---\n", encoding="utf-8")
+    post = LazyPost(str(path))
+    assert post.metadata == {}
+    assert post.get("session_id") is None
@@ -0,0 +1,102 @@
+"""
+Tests for plan_posts and apply_plan against a temporary output directory.
+"""
+import os
+
+from jekyll_post_tool import (ACTION_CREATE, ACTION_UPDATE, ACTION_RENAME, ACTION_DELETE,
+                              JekyllPostTool, PostManifest, plan_posts, apply_plan)
+
+
+def post(session_id, file_name, title="Title"):
+    return ({"title": title, "session_id": session_id}, "Content", file_name)
+
+
+def write(tmp_path, *posts):
+    post_tool = JekyllPostTool({"output": str(tmp_path) + "/"})
+    for front_matter, content, file_name in posts:
+        post_tool.write_post(front_matter, content, file_name)
+
+
+def reconcile(tmp_path, desired, prune=True, dry_run=False, builder=None):
+    manifest = PostManifest(str(tmp_path))
+    manifest.refresh()
+    plan = plan_posts(desired, manifest, prune=prune)
+    post_tool = JekyllPostTool({"output": str(tmp_path) + "/"})
+    return apply_plan(plan, post_tool, dry_run=dry_run, builder=builder)
+
+
+def posts_in(tmp_path):
+    return sorted(name for name in os.listdir(str(tmp_path))
+                  if name.endswith(".md") and os.path.isfile(str(tmp_path / name)))
+
+
+def fail_for_b(record):
+    if record[0]["session_id"] == "B":
+        raise ValueError("cannot build B")
+    return record
+
+
+def test_create_update_rename_and_delete(tmp_path):
+    write(tmp_path, post("A", "a.md"), post("B", "b-old.md"), post("C", "c.md"))
+    result = reconcile(tmp_path, {
+        "A": post("A", "a.md", title="New title"),
+        "B": post("B", "b.md"),
+        "D": post("D", "d.md"),
+    })
+    assert result["actions"] == {ACTION_CREATE: 1, ACTION_UPDATE: 1, ACTION_RENAME: 1,
+                                 ACTION_DELETE: 1}
+    assert posts_in(tmp_path) == ["a.md", "b.md", "d.md"]
+    with open(str(tmp_path / "a.md")) as post_file:
+        assert "New title" in post_file.read()
+
+
+def test_duplicates_keep_the_correctly_named_post(tmp_path):
+    write(tmp_path, post("A", "a-copy.md"), post("A", "a.md"), post("A", "z-copy.md"))
+    result = reconcile(tmp_path, {"A": post("A", "a.md")})
+    assert result["actions"][ACTION_UPDATE] == 1
+    assert result["actions"][ACTION_RENAME] == 0
+    assert result["actions"][ACTION_DELETE] == 2
+    assert posts_in(tmp_path) == ["a.md"]
+
+
+def test_duplicates_without_the_right_name_rename_one(tmp_path):
+    write(tmp_path, post("A", "a-1.md"), post("A", "a-2.md"))
+    result = reconcile(tmp_path, {"A": post("A", "a.md")})
+    assert result["actions"][ACTION_RENAME] == 1
+    assert result["actions"][ACTION_DELETE] == 1
+    assert posts_in(tmp_path) == ["a.md"]
+
+
+def test_a_rename_whose_write_failed_keeps_the_old_post(tmp_path):
+    write(tmp_path, post("A", "a-old.md"))
+    # A directory in the way makes the write of the new name fail
+    os.mkdir(str(tmp_path / "a.md"))
+    result = reconcile(tmp_path, {"A": post("A", "a.md")})
+    assert result["written"]["results"][0]["error"] is not None
+    assert posts_in(tmp_path) == ["a-old.md"]
+
+
+def test_a_rename_whose_builder_failed_keeps_the_old_post(tmp_path):
+    write(tmp_path, post("A", "a-old.md"), post("B", "b-old.md"))
+    reconcile(tmp_path, {"A": post("A", "a.md"), "B": post("B", "b.md")}, builder=fail_for_b)
+    assert posts_in(tmp_path) == ["a.md", "b-old.md"]
+
+
+def test_without_prune_posts_missing_from_desired_are_kept(tmp_path):
+    write(tmp_path, post("A", "a.md"), post("B", "b.md"))
+    result = reconcile(tmp_path, {"A": post("A", "a.md")}, prune=False)
+    assert result["actions"][ACTION_DELETE] == 0
+    assert posts_in(tmp_path) == ["a.md", "b.md"]
+    # Duplicates of a desired session are still removed
+    write(tmp_path, post("A", "a-copy.md"))
+    reconcile(tmp_path, {"A": post("A", "a.md")}, prune=False)
+    assert posts_in(tmp_path) == ["a.md", "b.md"]
+
+
+def test_dry_run_changes_nothing(tmp_path):
+    write(tmp_path, post("A", "a-old.md"), post("B", "b.md"))
+    result = reconcile(tmp_path, {"A": post("A", "a.md"), "C": post("C", "c.md")}, dry_run=True)
+    assert result["written"] is None
+    assert result["actions"] == {ACTION_CREATE: 1, ACTION_UPDATE: 0, ACTION_RENAME: 1,
+                                 ACTION_DELETE: 1}
+    assert posts_in(tmp_path) == ["a-old.md", "b.md"]
@@ -0,0 +1,68 @@
+"""
+Tests for SourceCache invalidation.
+"""
+import os
+
+from jekyll_post_tool import SourceCache
+
+
+RECORDS = [{"session_id": "A-1", "title": "A"}, {"session_id": "B-1", "title": "B"},
+           {"session_id": "A-1", "title": "A again"}]
+
+
+def make_source(tmp_path, content="session_id,title\n"):
+    path = str(tmp_path / "sessions.csv")
+    with open(path, "w") as source_file:
+        source_file.write(content)
+    return path
+
+
+def touch(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10 ** 9))
+
+
+def test_records_are_fresh_until_the_source_changes(tmp_path):
+    path = make_source(tmp_path)
+    cache = SourceCache(str(tmp_path / "cache.sqlite3"))
+    assert not cache.is_fresh("sessions", path)
+    assert cache.store("sessions", path, RECORDS, "session_id") == 3
+    assert cache.is_fresh("sessions", path)
+    assert [record["title"] for record in cache.get("sessions", "A-1")] == ["A", "A again"]
+    assert list(cache.iter_records("sessions", batch_size=2)) == RECORDS
+    # Another path, or the same name for another source, is not fresh
+    (tmp_path / "other").mkdir()
+    assert not cache.is_fresh("sessions", make_source(tmp_path / "other"))
+    assert not cache.is_fresh("users", path)
+
+
+def test_a_touched_source_with_the_same_content_is_still_fresh(tmp_path):
+    path = make_source(tmp_path)
+    cache = SourceCache(str(tmp_path / "cache.sqlite3"))
+    cache.store("sessions", path, RECORDS, "session_id")
+    touch(path)
+    assert cache.is_fresh("sessions", path)
+    # The new mtime is recorded so the file is not hashed again
+    row = cache._connection.execute("SELECT mtime_ns FROM sources").fetchone()
+    assert row[0] == os.stat(path).st_mtime_ns
+
+
+def test_a_changed_source_with_the_same_size_is_stale(tmp_path):
+    path = make_source(tmp_path, "session_id,title\nA-1,A\n")
+    cache = SourceCache(str(tmp_path / "cache.sqlite3"))
+    cache.store("sessions", path, RECORDS, "session_id")
+    stat = os.stat(path)
+    make_source(tmp_path, "session_id,title\nB-1,B\n")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert not cache.is_fresh("sessions", path)
+
+
+def test_the_cache_persists_between_runs(tmp_path):
+    path = make_source(tmp_path)
+    cache_path = str(tmp_path / "cache.sqlite3")
+    cache = SourceCache(cache_path)
+    cache.store("sessions", path, RECORDS, "session_id")
+    cache.close()
+    cache = SourceCache(cache_path)
+    assert cache.is_fresh("sessions", path)
+    assert len(cache.get("sessions", "B-1")) == 1
@@ -0,0 +1,59 @@
+"""
+Tests for iter_json_array, fed the same text in chunks of every size.
+"""
+import json
+
+import pytest
+
+from jekyll_post_tool import iter_json_array
+
+
+def chunked(text, size):
+    data = text.encode("utf-8")
+    return [data[index:index + size] for index in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("text", [
+    "[]",
+    " \n[ ]\n",
+    "\ufeff[1]",
+    '[0.25, -1e3, true, null, "x,]", {"a": [1, {"b": "]"}]}, []]',
+    '[{"name": "Über straße", "bio": "性能 データ"}, "naïve"]',
+])
+def test_elements_match_json_loads_for_every_chunk_size(text):
+    expected = json.loads(text.lstrip("\ufeff"))
+    for size in range(1, len(text.encode("utf-8")) + 1):
+        assert list(iter_json_array(chunked(text, size))) == expected
+
+
+def test_str_chunks():
+    assert list(iter_json_array(["[1, ", "2", "3]"])) == [1, 23]
+
+
+def test_elements_are_yielded_before_the_array_ends():
+    def chunks():
+        yield '[{"a": 1}, '
+        raise AssertionError("read past the first element")
+
+    assert next(iter_json_array(chunks())) == {"a": 1}
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "{}",
+    "[",
+    "[1",
+    "[1,",
+    "[1 2]",
+    "[1,,2]",
+    "[1,]",
+    "[,1]",
+    "[1] x",
+    "[1]]",
+    "[1][2]",
+    '["unterminated]',
+])
+def test_malformed_arrays_are_rejected(text):
+    for size in range(1, len(text) + 2):
+        with pytest.raises(ValueError):
+            list(iter_json_array(chunked(text, size)))